@@ -0,0 +1,77 @@
+"""
+Batch propagation of independent SolarSystem.Simulate scenarios
+Scenarios are spread over a process pool. Every worker streams its
+history into a trajectory store on disk (mio.TrajectoryWriter), so only
+the store path and timings travel back through the pool. Open the
+results lazily with mio.TrajectoryStore.
+
+A scenario spec is a dict:
+    tfinal, timestep, tnext      as in SolarSystem.Simulate
+    fixed                        optional, default True
+    julian_day                   start from the JPL ephemeris at this epoch, or
+    bodies                       list of dicts with M, r, pos, vel, name, color
+    options                      optional extra keyword arguments for Simulate
+                                 (method, gravity, rtol, ...)
+    name                         optional label, also the store directory name
+"""
+
+import contextlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import solarsys as SS
+
+
+def build_system(spec):
+    """Create the SolarSystem described by a scenario spec"""
+    name = spec.get('name', 'Scenario')
+    if 'bodies' in spec:
+        satellites = [SS.Satellite(body['M'], body['r'], np.asarray(body['pos'], dtype=float),
+                                   np.asarray(body['vel'], dtype=float), body['name'],
+                                   body.get('color', 'black'), 0) for body in spec['bodies']]
+        return SS.SolarSystem(satellites, name)
+    jpl = SS.JPL(spec['julian_day'])
+    system = jpl.MilkyWay
+    system.name = name
+    pos, vel = jpl.InitialStates(spec['julian_day'], [satellite.name for satellite in system.satellites])
+    system.pos[...] = pos
+    system.vel[...] = vel
+    return system
+
+
+def run_scenario(index, spec, out_dir, verbose=False):
+    """Propagate one scenario into out_dir/<name> and return a small summary"""
+    name = spec.get('name', 'scenario_%05d' % index)
+    store = os.path.join(out_dir, name)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+        system = build_system(dict(spec, name=name))
+        system.Simulate(spec['tfinal'], spec['timestep'], spec['tnext'], spec.get('fixed', True),
+                        store=store, derived=False, **spec.get('options', {}))
+    return {
+        'index': index,
+        'name': name,
+        'store': store,
+        'samples': len(system.time),
+        'integrator_stats': system.integrator_stats,
+        'wall_time': time.perf_counter() - start,
+        'pid': os.getpid()
+    }
+
+
+def propagate(specs, out_dir, max_workers=None, verbose=False):
+    """Run every scenario spec on a process pool, results come back in spec order"""
+    os.makedirs(out_dir, exist_ok=True)
+    max_workers = max_workers or os.cpu_count()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run_scenario, index, spec, out_dir, verbose) for index, spec in enumerate(specs)]
+        results = [future.result() for future in futures]
+    total = time.perf_counter() - start
+    busy = sum(result['wall_time'] for result in results)
+    print('Propagated', len(results), 'scenarios on', max_workers, 'workers in', round(total, 3), 's')
+    print('Scenario wall time (s): total', round(busy, 3), 'max', round(max([r['wall_time'] for r in results] or [0]), 3))
+    return results
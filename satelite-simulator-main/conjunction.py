@@ -0,0 +1,151 @@
+"""
+Close-approach (conjunction) screening for propagated trajectories
+Samples are screened in windows of consecutive steps. Within a window each
+body is reduced to the bounding box of its samples, and the boxes are hashed
+into a uniform grid with cells as large as a typical box plus the threshold,
+so only bodies in the same or neighbouring cells are paired. The few fast
+bodies whose boxes do not fit a cell are tested against everyone by box
+overlap. Surviving pairs are checked segment by segment assuming linear
+relative motion between samples, which also gives the time of closest
+approach. Nothing of size N^2 is built unless the bodies really are that
+crowded.
+"""
+
+import numpy as np
+
+EVENT_DTYPE = np.dtype([('i', np.int64), ('j', np.int64), ('tca', np.float64), ('dca', np.float64),
+                        ('vrel', np.float64), ('tstart', np.float64), ('tend', np.float64)])
+
+##The 13 neighbour cells after a cell in key order, the other 13 are
+##visited from the neighbour's side
+NEIGHBOURS = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)
+                       if (dx, dy, dz) > (0, 0, 0)])
+
+
+def expand_runs(start_a, count_a, start_b, count_b):
+    """Every (a, b) index pair between the runs start_a[k]:+count_a[k] and start_b[k]:+count_b[k]"""
+    sizes = count_a*count_b
+    run = np.repeat(np.arange(len(sizes)), sizes)
+    local = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return start_a[run] + local//count_b[run], start_b[run] + local % count_b[run]
+
+
+def grid_pairs(lower, upper, reach):
+    """Candidate pairs (i < j) of bounding boxes that may come within reach of each other"""
+    n = len(lower)
+    extent = np.max(upper - lower, axis=1)
+    ##Cells fit a typical box, anything much larger is paired by brute force
+    typical = 4.0*np.median(extent) if n else 0.0
+    fast = extent > typical
+    slow = np.flatnonzero(~fast)
+    center = 0.5*(lower[slow] + upper[slow])
+    first = [np.empty(0, dtype=np.int64)]
+    second = [np.empty(0, dtype=np.int64)]
+
+    if slow.size > 1:
+        ##Centres of boxes within reach differ by at most one cell on every axis.
+        ##Capping the cell count per axis keeps packed keys inside int64, larger
+        ##cells only cost extra candidates.
+        origin = center.min(axis=0)
+        size = max(typical + reach, np.max(center.max(axis=0) - origin)/2**20, np.finfo(float).tiny)
+        cell = np.floor((center - origin)/size).astype(np.int64) + 1
+        dims = cell.max(axis=0) + 2
+        key = (cell[:, 0]*dims[1] + cell[:, 1])*dims[2] + cell[:, 2]
+        order = np.argsort(key, kind='stable')
+        cells, start, count = np.unique(key[order], return_index=True, return_counts=True)
+
+        a, b = expand_runs(start, count, start, count)
+        keep = a < b
+        first.append(order[a[keep]])
+        second.append(order[b[keep]])
+        for dx, dy, dz in NEIGHBOURS:
+            neighbour = cells + (dx*dims[1] + dy)*dims[2] + dz
+            slot = np.minimum(np.searchsorted(cells, neighbour), len(cells) - 1)
+            found = cells[slot] == neighbour
+            a, b = expand_runs(start[found], count[found], start[slot[found]], count[slot[found]])
+            first.append(order[a])
+            second.append(order[b])
+        first = [slow[pairs] for pairs in first]
+        second = [slow[pairs] for pairs in second]
+
+    ##Fast bodies against every other body, each pair once
+    for i in np.flatnonzero(fast):
+        others = np.flatnonzero(~fast | (np.arange(n) > i))
+        others = others[others != i]
+        first.append(np.full(others.size, i))
+        second.append(others)
+
+    i = np.concatenate(first)
+    j = np.concatenate(second)
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+def box_distance(lower, upper, i, j):
+    """Smallest distance between the boxes of bodies i and j"""
+    gap = np.maximum(np.maximum(lower[i] - upper[j], lower[j] - upper[i]), 0.0)
+    return np.sqrt(np.einsum('ij,ij->i', gap, gap))
+
+
+def screen(time, xyz, threshold, window=16):
+    """Find every pair of bodies that comes closer than threshold
+
+    time is (T,) and xyz is (T,N,3), e.g. SolarSystem.time and .xyz or a
+    memory-mapped trajectory store window. Returns a structured array with
+    EVENT_DTYPE, one row per encounter sorted by tca: the body indices
+    i < j, time and distance of closest approach, relative speed there,
+    and the first and last sample time of the encounter.
+    """
+    time = np.asarray(time, dtype=float)
+    hits = []
+    for first in range(0, len(time) - 1, window):
+        last = min(first + window, len(time) - 1)
+        block = np.asarray(xyz[first:last+1], dtype=float)
+        lower = block.min(axis=0)
+        upper = block.max(axis=0)
+        i, j = grid_pairs(lower, upper, threshold)
+        near = box_distance(lower, upper, i, j) <= threshold
+        i = i[near]
+        j = j[near]
+        if i.size == 0:
+            continue
+
+        ##Closest point of the relative motion on every segment of the window
+        rel = block[:, i, :] - block[:, j, :]
+        start = rel[:-1]
+        delta = rel[1:] - rel[:-1]
+        length2 = np.einsum('spk,spk->sp', delta, delta)
+        moving = length2 > 0
+        s = np.zeros_like(length2)
+        s[moving] = np.clip(-np.einsum('spk,spk->sp', start, delta)[moving]/length2[moving], 0.0, 1.0)
+        closest = start + s[:, :, np.newaxis]*delta
+        dist = np.sqrt(np.einsum('spk,spk->sp', closest, closest))
+        segment, pair = np.nonzero(dist <= threshold)
+        dt = np.diff(time[first:last+1])[segment]
+        hits.append((i[pair], j[pair], first + segment, dist[segment, pair],
+                     time[first + segment] + s[segment, pair]*dt,
+                     np.sqrt(length2[segment, pair])/np.where(dt > 0, dt, np.inf)))
+
+    if not hits:
+        return np.zeros(0, dtype=EVENT_DTYPE)
+    i, j, segment, dist, tca, vrel = [np.concatenate(column) for column in zip(*hits)]
+
+    ##Consecutive close segments of one pair are a single encounter
+    order = np.lexsort((segment, j, i))
+    i, j, segment, dist, tca, vrel = i[order], j[order], segment[order], dist[order], tca[order], vrel[order]
+    new = np.ones(len(i), dtype=bool)
+    new[1:] = (i[1:] != i[:-1]) | (j[1:] != j[:-1]) | (segment[1:] != segment[:-1] + 1)
+    group = np.cumsum(new) - 1
+    starts = np.flatnonzero(new)
+    ends = np.append(starts[1:], len(i)) - 1
+    closest = np.lexsort((dist, group))
+    best = closest[np.searchsorted(group[closest], np.arange(len(starts)))]
+
+    events = np.zeros(len(starts), dtype=EVENT_DTYPE)
+    events['i'] = i[best]
+    events['j'] = j[best]
+    events['tca'] = tca[best]
+    events['dca'] = dist[best]
+    events['vrel'] = vrel[best]
+    events['tstart'] = time[segment[starts]]
+    events['tend'] = time[segment[ends] + 1]
+    return events[np.argsort(events['tca'], kind='stable')]
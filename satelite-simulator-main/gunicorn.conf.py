@@ -0,0 +1,96 @@
+"""
+Gunicorn settings for serving the quantum navigation API
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Environment overrides:
+    QUANTUM_BIND         address to listen on (0.0.0.0:5000)
+    QUANTUM_WORKERS      worker processes (one per core)
+    QUANTUM_THREADS      request threads per worker (4), every open job
+                         event stream holds one of them
+    QUANTUM_AER_THREADS  threads one Aer run may use (cores / workers)
+    QUANTUM_AER_RUNS     Aer runs one worker executes at once, the rest of
+                         its request and job threads wait (cores / workers
+                         / QUANTUM_AER_THREADS, at least 1)
+    QUANTUM_JOB_DIR      job table shared by the workers (a temporary
+                         directory, removed again when the server stops)
+
+Circuit ids encode the circuit itself and jobs live in QUANTUM_JOB_DIR,
+so any worker answers for any circuit or job: a job runs in the worker
+that accepted it, the others read its status, result and events from
+the directory and cancel it through there. Runs x Aer threads stay
+within each worker's share of the cores however many threads it has.
+"""
+
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+
+cores = multiprocessing.cpu_count()
+
+bind = os.environ.get('QUANTUM_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('QUANTUM_WORKERS', cores))
+worker_class = 'gthread'
+threads = int(os.environ.get('QUANTUM_THREADS', 4))
+
+# Simulations are CPU bound, split the cores between the workers
+worker_cores = max(1, cores // workers)
+os.environ.setdefault('QUANTUM_AER_THREADS', str(worker_cores))
+os.environ.setdefault('QUANTUM_AER_RUNS', str(max(1, worker_cores // int(os.environ['QUANTUM_AER_THREADS']))))
+
+# Workers import the app after the fork, never share one simulator
+preload_app = False
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Circuit ids of large Grover marked sets get long, allow the longest request line
+limit_request_line = 8190
+
+# Job directory on_starting made, on_exit removes it again
+created_job_dir = None
+
+
+def on_starting(server):
+    """Create the shared job directory before the workers fork, they inherit QUANTUM_JOB_DIR"""
+    global created_job_dir
+    if not os.environ.get('QUANTUM_JOB_DIR'):
+        created_job_dir = os.environ['QUANTUM_JOB_DIR'] = tempfile.mkdtemp(prefix='quantum-jobs-')
+    server.log.info("job table in %s", os.environ['QUANTUM_JOB_DIR'])
+
+
+def post_worker_init(worker):
+    """Build the simulator and compile the default circuits before the worker takes traffic
+
+    Also report 'stopping' on /ready the moment SIGTERM arrives, gunicorn's
+    own handler then lets the requests in flight drain.
+    """
+    import quantum_backend
+    quantum_backend.warm_up()
+    
+    handle_exit = signal.getsignal(signal.SIGTERM)
+    
+    def stop(signum, frame):
+        quantum_backend.stop_accepting()
+        handle_exit(signum, frame)
+    signal.signal(signal.SIGTERM, stop)
+
+
+def worker_int(worker):
+    """SIGINT or SIGQUIT, the worker exits at once"""
+    import quantum_backend
+    quantum_backend.stop_accepting()
+
+
+def worker_exit(server, worker):
+    """Cancel the worker's jobs and wait for its job threads on graceful shutdown"""
+    import quantum_backend
+    quantum_backend.shutdown()
+
+
+def on_exit(server):
+    """Remove the job directory on_starting created"""
+    if created_job_dir is not None:
+        shutil.rmtree(created_job_dir, ignore_errors=True)
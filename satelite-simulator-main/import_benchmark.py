@@ -0,0 +1,112 @@
+"""
+Startup cost of the simulator modules
+Each module is imported in a fresh interpreter with `python -X importtime`,
+so the numbers cover everything it pulls in, and the report lists which
+heavy stacks (plotting, quantum, web) the import loaded. The numeric core
+(mio, octree, solarsys, batch) should load none of them.
+
+    python import_benchmark.py                      all modules
+    python import_benchmark.py solarsys batch -r 5  best of 5 runs
+    python import_benchmark.py --json startup.json  keep results for comparison
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+MODULES = ('mio', 'octree', 'solarsys', 'batch', 'render', 'plotting', 'main',
+           'quantum_backend', 'pennylane_simulator')
+HEAVY = ('matplotlib', 'scipy', 'qiskit', 'qiskit_aer', 'pennylane', 'flask')
+PROBE = "import sys, {module}; print(' '.join(m for m in {heavy!r} if m in sys.modules))"
+
+
+def parse_importtime(stderr, module):
+    """Return (cumulative seconds, [(dependency, seconds)]) for module from -X importtime output"""
+    total = 0.0
+    children = []
+    pending = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        if not fields[1].strip().isdigit():
+            continue ##Column header
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip()))//2
+        cumulative = int(fields[1])*1e-6
+        ##Children are printed before their parent, so collect the level below until the parent shows up
+        if depth == 1:
+            pending.append((name.strip(), cumulative))
+        elif depth == 0:
+            if name.strip() == module:
+                total = cumulative
+                children = pending
+            pending = []
+    return total, sorted(children, key=lambda child: -child[1])
+
+
+def measure_import(module, repeat=3, top=5):
+    """Import module in fresh interpreters and keep the fastest run"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(0, repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE.format(module=module, heavy=HEAVY)],
+                              cwd=here, capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return {'module': module, 'error': lines[-1] if lines else 'exit code ' + str(proc.returncode)}
+        total, children = parse_importtime(proc.stderr, module)
+        if best is None or total < best['import_time']:
+            best = {
+                'module': module,
+                'import_time': total,
+                'wall_time': wall,
+                'heavy': proc.stdout.split(),
+                'dependencies': children[:top]
+            }
+    return best
+
+
+def interpreter_startup(repeat=3):
+    """Wall time of a bare interpreter, the floor under every wall_time"""
+    times = []
+    for _ in range(0, repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import time of the simulator modules')
+    parser.add_argument('modules', nargs='*', default=list(MODULES))
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per module, the fastest is kept')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    baseline = interpreter_startup(args.repeat)
+    print('Interpreter startup %.1f ms' % (baseline*1e3))
+    print('%-22s %10s %10s  %s' % ('module', 'import ms', 'wall ms', 'heavy stacks loaded / largest dependencies'))
+    results = []
+    for module in args.modules:
+        result = measure_import(module, args.repeat)
+        results.append(result)
+        if 'error' in result:
+            print('%-22s %10s %10s  %s' % (module, '-', '-', result['error']))
+            continue
+        dependencies = ', '.join('%s %.0f' % (name, seconds*1e3) for name, seconds in result['dependencies'])
+        print('%-22s %10.1f %10.1f  [%s] %s' % (module, result['import_time']*1e3, result['wall_time']*1e3,
+                                                ' '.join(result['heavy']), dependencies))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version, 'interpreter_startup': baseline, 'modules': results}, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -4,12 +4,13 @@ Satellite Simulator - Main Entry Point
 Simulates satellites in orbit around celestial bodies
 """
 
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
 import solarsys as SS
 import numpy as np
 
 def main():
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
     print("=" * 60)
     print("SATELLITE SIMULATOR")
     print("=" * 60)
@@ -1,9 +1,138 @@
+import json
+import os
 import numpy as np
 
+ELEMENT_FIELDS = ('a0', 'e0', 'i0', 'L0', 'wbar0', 'OMEGA0',
+                  'adot', 'edot', 'idot', 'Ldot', 'wbardot', 'OMEGAdot')
+ELEMENT_DTYPE = np.dtype([(field, np.float64) for field in ELEMENT_FIELDS])
+
+
+def resolve_path(filename):
+    """Data files are looked up in the working directory first, then next to this module"""
+    if os.path.isabs(filename) or os.path.exists(filename):
+        return filename
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
+
+
 def dlmread(filename, delimiter):
     """Read delimited file and return as numpy array"""
+    filename = resolve_path(filename)
     try:
         return np.loadtxt(filename, delimiter=delimiter)
     except FileNotFoundError:
         print(f"Warning: {filename} not found. Returning empty array.")
         return np.array([])
+
+
+def load_elements(filename, cache=True):
+    """Load an orbital-element catalog into a structured array with ELEMENT_DTYPE
+
+    The text format is two comma separated lines per body: the six elements
+    at J2000 (a, e, i, L, long. perihelion, long. node) followed by their
+    rates per century. The parsed catalog is kept in <filename>.npz next to
+    the source and only rebuilt when the source size or mtime changes.
+    """
+    filename = resolve_path(filename)
+    status = os.stat(filename)
+    stamp = np.array([status.st_mtime_ns, status.st_size], dtype=np.int64)
+    cache_file = filename + '.npz'
+    if cache and os.path.exists(cache_file):
+        try:
+            with np.load(cache_file) as cached:
+                if np.array_equal(cached['stamp'], stamp) and cached['elements'].dtype == ELEMENT_DTYPE:
+                    return cached['elements']
+        except (OSError, ValueError, KeyError):
+            pass ##Unreadable cache, rebuild it
+
+    values = np.loadtxt(filename, delimiter=',', ndmin=2)
+    if values.shape[1] != 6 or len(values) % 2 != 0:
+        raise ValueError(f"{filename} must hold pairs of 6-column element/rate lines")
+    elements = np.ascontiguousarray(values.reshape(-1, 12)).view(ELEMENT_DTYPE).reshape(-1)
+    if cache:
+        ##Write to a temporary name first so readers never see a partial cache
+        partial = cache_file + '.tmp.npz'
+        try:
+            np.savez(partial, elements=elements, stamp=stamp)
+            os.replace(partial, cache_file)
+        except OSError:
+            print(f"Warning: could not write element cache {cache_file}")
+    return elements
+
+
+class TrajectoryWriter:
+    """Stream recorded states to disk in fixed-size chunks
+
+    A store is a directory holding raw float64 files that grow by appending
+    whole chunks (times.f64 and states.f64, one (N,6) position/velocity
+    block per sample) and a small meta.json header with the body names and
+    the number of samples flushed so far. Has the same Record/Finalize
+    interface as solarsys.TrajectoryRecorder.
+    """
+
+    def __init__(self, path, names, chunk_size=1024):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.names = list(names)
+        self.chunk_size = chunk_size
+        self.time = np.empty(chunk_size)
+        self.states = np.empty((chunk_size, len(self.names), 6))
+        self.buffered = 0
+        self.count = 0
+        ##Truncate any previous run in this directory
+        open(os.path.join(path, 'times.f64'), 'wb').close()
+        open(os.path.join(path, 'states.f64'), 'wb').close()
+        self.WriteHeader()
+
+    def Record(self, t, pos, vel):
+        self.time[self.buffered] = t
+        self.states[self.buffered, :, 0:3] = pos
+        self.states[self.buffered, :, 3:6] = vel
+        self.buffered += 1
+        if self.buffered == self.chunk_size:
+            self.Flush()
+
+    def Flush(self):
+        if self.buffered == 0:
+            return
+        with open(os.path.join(self.path, 'times.f64'), 'ab') as f:
+            self.time[:self.buffered].tofile(f)
+        with open(os.path.join(self.path, 'states.f64'), 'ab') as f:
+            self.states[:self.buffered].tofile(f)
+        self.count += self.buffered
+        self.buffered = 0
+        self.WriteHeader()
+
+    def WriteHeader(self):
+        header = {'names': self.names, 'count': self.count, 'layout': 'time,body,[x,y,z,vx,vy,vz]', 'dtype': 'float64'}
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump(header, f)
+
+    def Finalize(self):
+        """Flush the last partial chunk and return memory-mapped (time, xyz, xyzdot)"""
+        self.Flush()
+        return TrajectoryStore(self.path).Window()
+
+
+class TrajectoryStore:
+    """Lazy reader for a directory written by TrajectoryWriter"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            header = json.load(f)
+        self.names = header['names']
+        self.count = header['count']
+        shape = (self.count, len(self.names), 6)
+        if self.count == 0:
+            self.times = np.empty(0)
+            self.states = np.empty(shape)
+        else:
+            self.times = np.memmap(os.path.join(path, 'times.f64'), dtype=np.float64, mode='r', shape=(self.count,))
+            self.states = np.memmap(os.path.join(path, 'states.f64'), dtype=np.float64, mode='r', shape=shape)
+
+    def Window(self, tstart=None, tstop=None, stride=1):
+        """Return (time, xyz, xyzdot) for tstart <= t <= tstop without reading the data"""
+        first = 0 if tstart is None else int(np.searchsorted(self.times, tstart, side='left'))
+        last = self.count if tstop is None else int(np.searchsorted(self.times, tstop, side='right'))
+        states = self.states[first:last:stride]
+        return self.times[first:last:stride], states[:, :, 0:3], states[:, :, 3:6]
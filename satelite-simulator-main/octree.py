@@ -0,0 +1,159 @@
+"""
+Tree-code and test-particle gravity backends for SolarSystem.Accelerations
+Both follow Satellite.Gravity: a_i = -sum_j mu_j (r_i - r_j)/|r_i - r_j|^3,
+skipping pairs closer than 1e-2 m.
+"""
+
+import numpy as np
+
+
+class Octree:
+    """Barnes-Hut octree with the gravitational parameter and centre of mass of every node
+
+    Bodies are reordered so that each node owns the contiguous slice
+    order[start:end], which lets leaves be expanded into body pairs with
+    plain array arithmetic.
+    """
+
+    def __init__(self, pos, mu, leaf_size=8):
+        pos = np.asarray(pos, dtype=float)
+        mu = np.asarray(mu, dtype=float)
+        self.order = np.arange(len(pos))
+        lower = pos.min(axis=0)
+        upper = pos.max(axis=0)
+        root_half = max(0.5*np.max(upper - lower), 1.0)*(1.0 + 1e-9)
+
+        center = [0.5*(lower + upper)]
+        half = [root_half]
+        start = [0]
+        end = [len(pos)]
+        children = [np.full(8, -1)]
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            count = end[node] - start[node]
+            ##Coincident bodies would split forever, stop at a tiny cell
+            if count <= leaf_size or half[node] < 1e-9*root_half:
+                continue
+            members = self.order[start[node]:end[node]]
+            octant = ((pos[members] > center[node])*np.array([1, 2, 4])).sum(axis=1)
+            sort = np.argsort(octant, kind='stable')
+            self.order[start[node]:end[node]] = members[sort]
+            bounds = np.searchsorted(octant[sort], np.arange(9))
+            for k in range(0, 8):
+                if bounds[k+1] == bounds[k]:
+                    continue
+                offset = (np.array([k & 1, (k >> 1) & 1, (k >> 2) & 1])*2 - 1)*half[node]/2.0
+                children[node][k] = len(center)
+                center.append(center[node] + offset)
+                half.append(half[node]/2.0)
+                start.append(start[node] + bounds[k])
+                end.append(start[node] + bounds[k+1])
+                children.append(np.full(8, -1))
+                stack.append(len(center) - 1)
+
+        self.center = np.asarray(center)
+        self.half = np.asarray(half)
+        self.start = np.asarray(start)
+        self.end = np.asarray(end)
+        self.children = np.asarray(children)
+        self.leaf = np.all(self.children < 0, axis=1)
+
+        ##Leaves partition the body order, so their sums come from one reduceat.
+        ##Parents are always created before their children, which lets a reverse
+        ##sweep fill in every internal node without prefix-sum cancellation.
+        weighted = mu[self.order, np.newaxis]*pos[self.order]
+        self.mu = np.zeros(len(self.center))
+        moment = np.zeros((len(self.center), 3))
+        leaves = np.flatnonzero(self.leaf)
+        leaves = leaves[np.argsort(self.start[leaves])]
+        self.mu[leaves] = np.add.reduceat(mu[self.order], self.start[leaves])
+        moment[leaves] = np.add.reduceat(weighted, self.start[leaves], axis=0)
+        for node in np.flatnonzero(~self.leaf)[::-1]:
+            child = self.children[node][self.children[node] >= 0]
+            self.mu[node] = self.mu[child].sum()
+            moment[node] = moment[child].sum(axis=0)
+        self.com = self.center.copy()
+        massive = self.mu > 0
+        self.com[massive] = moment[massive]/self.mu[massive, np.newaxis]
+
+    def Accelerations(self, targets, pos, mu, theta=0.5):
+        """Acceleration of the bodies `targets` from the whole tree"""
+        accel = np.zeros((len(targets), 3))
+        local = np.arange(len(targets))
+        node = np.zeros(len(targets), dtype=int)
+        while local.size:
+            ##Massless nodes attract nothing
+            keep = self.mu[node] > 0
+            local = local[keep]
+            node = node[keep]
+
+            p = pos[targets[local]]
+            dr = p - self.com[node]
+            rnorm = np.sqrt(np.einsum('ij,ij->i', dr, dr))
+            inside = np.all(np.abs(p - self.center[node]) <= self.half[node, np.newaxis], axis=1)
+            accept = ~inside & (2.0*self.half[node] < theta*rnorm)
+            accept |= self.leaf[node] & (self.end[node] - self.start[node] == 1)
+            self.Accumulate(accel, local[accept], dr[accept], rnorm[accept], self.mu[node[accept]])
+
+            ##Opened leaves are summed directly body by body
+            direct = ~accept & self.leaf[node]
+            counts = self.end[node[direct]] - self.start[node[direct]]
+            pair_local = np.repeat(local[direct], counts)
+            first = np.repeat(self.start[node[direct]] - (np.cumsum(counts) - counts), counts)
+            source = self.order[first + np.arange(counts.sum())]
+            dr_direct = pos[targets[pair_local]] - pos[source]
+            rnorm_direct = np.sqrt(np.einsum('ij,ij->i', dr_direct, dr_direct))
+            self.Accumulate(accel, pair_local, dr_direct, rnorm_direct, mu[source])
+
+            ##Everything else is opened into its children
+            opened = ~accept & ~self.leaf[node]
+            local = np.repeat(local[opened], 8)
+            node = self.children[node[opened]].ravel()
+            valid = node >= 0
+            local = local[valid]
+            node = node[valid]
+        return accel
+
+    @staticmethod
+    def Accumulate(accel, local, dr, rnorm, mu):
+        close = rnorm < 1e-2
+        rnorm = np.where(close, 1.0, rnorm)
+        coeff = np.where(close, 0.0, mu/rnorm**3)
+        for k in range(0, 3):
+            accel[:, k] -= np.bincount(local, weights=coeff*dr[:, k], minlength=len(accel))
+
+
+def barnes_hut_accelerations(pos, mu, theta=0.5, leaf_size=8, chunk_size=4096):
+    """Approximate O(N log N) accelerations with opening angle theta"""
+    pos = np.asarray(pos, dtype=float)
+    tree = Octree(pos, mu, leaf_size)
+    accel = np.empty_like(pos)
+    for first in range(0, len(pos), chunk_size):
+        targets = np.arange(first, min(first + chunk_size, len(pos)))
+        accel[targets] = tree.Accelerations(targets, pos, mu, theta)
+    return accel
+
+
+def test_particle_accelerations(pos, mu, chunk_size=4096):
+    """Exact O(N*M) accelerations from the M bodies with mu > 0 only
+
+    Massless test particles feel the massive bodies but not each other.
+    """
+    pos = np.asarray(pos, dtype=float)
+    massive = np.flatnonzero(np.asarray(mu) > 0)
+    accel = np.zeros_like(pos)
+    if massive.size == 0:
+        return accel
+    source_pos = pos[massive]
+    source_mu = np.asarray(mu, dtype=float)[massive]
+    for first in range(0, len(pos), chunk_size):
+        last = min(first + chunk_size, len(pos))
+        dr = pos[first:last, np.newaxis, :] - source_pos[np.newaxis, :, :]
+        rnorm = np.sqrt(np.einsum('ijk,ijk->ij', dr, dr))
+        close = rnorm < 1e-2
+        rnorm[close] = 1.0
+        coeff = source_mu[np.newaxis, :]/rnorm**3
+        coeff[close] = 0.0
+        accel[first:last] = -np.einsum('ij,ijk->ik', coeff, dr)
+    return accel
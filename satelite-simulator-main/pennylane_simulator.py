@@ -3,21 +3,32 @@ PennyLane Quantum Simulator for Satellite Navigation
 Visual quantum circuit simulation with real-time visualization
 """
 
-import pennylane as qml
-from pennylane import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
-import json
+import numpy as np
+
+import quantum_kernels
+
+# PennyLane and matplotlib are imported inside the methods that use them,
+# so importing the navigator does not load either stack.
 
 class PennyLaneQuantumNavigator:
     """Quantum navigation using PennyLane framework"""
     
     def __init__(self, num_qubits=3):
         self.num_qubits = num_qubits
-        self.dev = qml.device('default.qubit', wires=num_qubits)
+        self._dev = None
+    
+    @property
+    def dev(self):
+        """PennyLane device, created on first use so the NumPy engine runs without PennyLane"""
+        if self._dev is None:
+            import pennylane as qml
+            self._dev = qml.device('default.qubit', wires=self.num_qubits)
+        return self._dev
         
     def visualize_superposition(self):
         """Create and visualize quantum superposition"""
+        import pennylane as qml
+        import matplotlib.pyplot as plt
         
         @qml.qnode(self.dev)
         def superposition_circuit():
@@ -95,8 +106,57 @@ class PennyLaneQuantumNavigator:
         
         return state, probabilities
     
-    def grover_algorithm(self, target_states=[1, 3]):
-        """Grover's Algorithm with visualization"""
+    def grover_algorithm(self, target_states=[1, 3], engine='pennylane', plot=True):
+        """Grover's Algorithm with visualization
+        
+        Works for any num_qubits. engine='numpy' computes the same
+        distribution with the native statevector kernel in quantum_kernels
+        instead of the qnode and needs neither PennyLane nor, with
+        plot=False, matplotlib.
+        """
+        if engine not in ('pennylane', 'numpy'):
+            raise ValueError(f"engine must be 'pennylane' or 'numpy', got {engine!r}")
+        
+        # Each marked state once, an oracle applied twice would unmark it
+        N = 2 ** self.num_qubits
+        targets = sorted(set(int(target) for target in target_states))
+        if not targets or targets[0] < 0 or targets[-1] >= N:
+            raise ValueError(f"target_states must be a non-empty list of states 0..{N - 1}")
+        
+        # Calculate optimal iterations, the same count as the Qiskit backend
+        optimal_iterations = quantum_kernels.grover_iterations(self.num_qubits, len(targets))
+        
+        # Run Grover's algorithm
+        if engine == 'numpy':
+            probabilities = quantum_kernels.grover_probabilities(self.num_qubits, targets, optimal_iterations)
+        else:
+            probabilities = self.grover_qnode(targets)(optimal_iterations)
+        
+        if plot:
+            self.plot_grover(targets, probabilities, optimal_iterations)
+        
+        # Find result
+        max_idx = np.argmax(probabilities)
+        max_prob = probabilities[max_idx]
+        
+        print(f"\n🔬 Grover's Algorithm Results:")
+        print(f"   Found state: |{max_idx:0{self.num_qubits}b}⟩ (decimal: {max_idx})")
+        print(f"   Probability: {max_prob:.1%}")
+        print(f"   Iterations: {optimal_iterations}")
+        print(f"   Quantum speedup: {N/max(optimal_iterations, 1):.1f}x vs classical")
+        
+        return max_idx, max_prob
+    
+    def grover_qnode(self, target_states):
+        """Grover circuit for the marked states, a qnode taking the iteration count"""
+        import pennylane as qml
+        
+        def multi_controlled_z():
+            """Phase flip of |1...1⟩, a plain Z on a single qubit"""
+            if self.num_qubits == 1:
+                qml.PauliZ(wires=0)
+            else:
+                qml.ctrl(qml.PauliZ(wires=self.num_qubits - 1), control=range(self.num_qubits - 1))
         
         def oracle(target):
             """Oracle marks target state"""
@@ -109,10 +169,7 @@ class PennyLaneQuantumNavigator:
                     qml.PauliX(wires=i)
             
             # Multi-controlled Z
-            if self.num_qubits == 3:
-                qml.MultiControlledX(wires=[0, 1, 2], control_values='11')
-                qml.PauliZ(wires=2)
-                qml.MultiControlledX(wires=[0, 1, 2], control_values='11')
+            multi_controlled_z()
             
             # Undo flips
             for i, bit in enumerate(binary):
@@ -127,10 +184,7 @@ class PennyLaneQuantumNavigator:
             for i in range(self.num_qubits):
                 qml.PauliX(wires=i)
             
-            if self.num_qubits == 3:
-                qml.MultiControlledX(wires=[0, 1, 2], control_values='11')
-                qml.PauliZ(wires=2)
-                qml.MultiControlledX(wires=[0, 1, 2], control_values='11')
+            multi_controlled_z()
             
             for i in range(self.num_qubits):
                 qml.PauliX(wires=i)
@@ -152,14 +206,13 @@ class PennyLaneQuantumNavigator:
             
             return qml.probs(wires=range(self.num_qubits))
         
-        # Calculate optimal iterations
-        N = 2 ** self.num_qubits
-        optimal_iterations = int(np.pi / 4 * np.sqrt(N))
-        
-        # Run Grover's algorithm
-        probabilities = grover_circuit(optimal_iterations)
+        return grover_circuit
+    
+    def plot_grover(self, target_states, probabilities, optimal_iterations):
+        """Bar chart of the Grover distribution with the marked states highlighted"""
+        import matplotlib.pyplot as plt
         
-        # Visualize
+        N = 2 ** self.num_qubits
         fig, ax = plt.subplots(figsize=(12, 6))
         
         states = [f'|{i:0{self.num_qubits}b}⟩' for i in range(2**self.num_qubits)]
@@ -170,7 +223,7 @@ class PennyLaneQuantumNavigator:
         ax.set_xlabel('Quantum State', fontsize=12, fontweight='bold')
         ax.set_ylabel('Probability', fontsize=12, fontweight='bold')
         ax.set_title(f"Grover's Algorithm - Finding States {target_states}\n" + 
-                    f"Iterations: {optimal_iterations} | Speedup: {N/optimal_iterations:.1f}x",
+                    f"Iterations: {optimal_iterations} | Speedup: {N/max(optimal_iterations, 1):.1f}x",
                     fontsize=14, fontweight='bold')
         ax.grid(axis='y', alpha=0.3)
         
@@ -192,21 +245,11 @@ class PennyLaneQuantumNavigator:
         plt.savefig('grover_algorithm_pennylane.png', dpi=150, bbox_inches='tight')
         print("✅ Saved: grover_algorithm_pennylane.png")
         plt.show()
-        
-        # Find result
-        max_idx = np.argmax(probabilities)
-        max_prob = probabilities[max_idx]
-        
-        print(f"\n🔬 Grover's Algorithm Results:")
-        print(f"   Found state: |{max_idx:0{self.num_qubits}b}⟩ (decimal: {max_idx})")
-        print(f"   Probability: {max_prob:.1%}")
-        print(f"   Iterations: {optimal_iterations}")
-        print(f"   Quantum speedup: {N/optimal_iterations:.1f}x vs classical")
-        
-        return max_idx, max_prob
     
     def vqe_optimization(self):
         """VQE for fuel optimization with visualization"""
+        import pennylane as qml
+        import matplotlib.pyplot as plt
         
         # Define Hamiltonian (energy function)
         coeffs = [1.0, 0.5, 0.3]
@@ -229,7 +272,7 @@ class PennyLaneQuantumNavigator:
         
         # Optimize
         optimizer = qml.GradientDescentOptimizer(stepsize=0.4)
-        params = np.random.random(self.num_qubits * 2) * 2 * np.pi
+        params = qml.numpy.array(np.random.random(self.num_qubits * 2) * 2 * np.pi, requires_grad=True)
         
         energies = []
         for step in range(50):
@@ -288,6 +331,8 @@ class PennyLaneQuantumNavigator:
     
     def draw_circuit(self):
         """Draw quantum circuit diagram"""
+        import pennylane as qml
+        import matplotlib.pyplot as plt
         
         @qml.qnode(self.dev)
         def full_circuit():
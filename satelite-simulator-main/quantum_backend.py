@@ -3,267 +3,1198 @@ Qiskit Quantum Backend for Satellite Navigation
 Connects JavaScript frontend to IBM Quantum computers
 """
 
-from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister, transpile
-from qiskit_aer import AerSimulator
-from qiskit.visualization import plot_histogram
-from qiskit.circuit.library import GroverOperator, QFT
-from qiskit.algorithms import VQE, QAOA
-from qiskit.algorithms.optimizers import COBYLA, SPSA
-from qiskit.primitives import Sampler
-import numpy as np
+import base64
 import json
-from flask import Flask, request, jsonify
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
+import quantum_jobs
+import quantum_kernels
+
+# Qiskit and Aer are imported on first use inside the functions below, so
+# importing this module does not pay for the stack.
+
 app = Flask(__name__)
 CORS(app)  # Allow JavaScript to call this API
 
-# Initialize Qiskit simulator (can switch to real IBM Quantum hardware)
-simulator = AerSimulator()
+
+# ============================================
+# CIRCUIT BUILDERS
+# ============================================
+
+def superposition_circuit(num_qubits, measure=True):
+    """Hadamard layer, phase interference and a CNOT chain"""
+    from qiskit import QuantumCircuit
+
+    qc = QuantumCircuit(num_qubits, num_qubits)
+    
+    # Apply Hadamard gates to create superposition
+    for q in range(num_qubits):
+        qc.h(q)
+    
+    # Apply phase gates for interference
+    for q in range(num_qubits):
+        phase = (q * np.pi) / num_qubits
+        qc.p(phase, q)
+    
+    # Create entanglement with CNOT gates
+    for q in range(num_qubits - 1):
+        qc.cx(q, q + 1)
+    
+    # Measure all qubits
+    if measure:
+        qc.measure(range(num_qubits), range(num_qubits))
+    return qc
+
+
+def multi_controlled_z(qc, num_qubits):
+    """Phase flip of |1...1⟩ on all qubits of qc"""
+    if num_qubits == 1:
+        qc.z(0)
+    else:
+        qc.mcp(np.pi, list(range(num_qubits - 1)), num_qubits - 1)
+
+
+def grover_oracle(num_qubits, target_states):
+    """
+    Phase oracle flipping the sign of every marked basis state
+    Bit q of a target is qubit q (the order of Aer bitstrings read right to
+    left). Each target is mapped onto |1...1⟩ by X gates and hit with one
+    multi-controlled Z; X gates shared by consecutive targets cancel.
+    """
+    from qiskit import QuantumCircuit
+
+    n = num_qubits
+    qc = QuantumCircuit(n)
+    flipped = 0
+    for target in target_states:
+        # Qubits whose target bit is 0 must be flipped
+        wanted = (2**n - 1) ^ target
+        change = flipped ^ wanted
+        if change:
+            qc.x([q for q in range(n) if change >> q & 1])
+        flipped = wanted
+        multi_controlled_z(qc, n)
+    if flipped:
+        qc.x([q for q in range(n) if flipped >> q & 1])
+    return qc
+
+
+def grover_diffusion(num_qubits):
+    """Diffusion operator, the reflection about the uniform superposition"""
+    from qiskit import QuantumCircuit
+
+    n = num_qubits
+    qc = QuantumCircuit(n)
+    qc.h(range(n))
+    qc.x(range(n))
+    multi_controlled_z(qc, n)
+    qc.x(range(n))
+    qc.h(range(n))
+    return qc
+
+
+def grover_circuit(num_qubits, oracle, iterations, measure=True, diffusion=None):
+    """
+    Grover iterations with the given phase oracle circuit
+    oracle and diffusion may be transpiled blocks, the circuit is only
+    composed from them.
+    """
+    from qiskit import QuantumCircuit
+
+    n = num_qubits
+    qc = QuantumCircuit(n, n)
+    if diffusion is None:
+        diffusion = grover_diffusion(n)
+    
+    # Initialize superposition
+    qc.h(range(n))
+    
+    for _ in range(iterations):
+        # Oracle: Mark target states (the blocks are shared, not copied)
+        qc.compose(oracle, inplace=True, copy=False)
+        
+        # Diffusion operator
+        qc.compose(diffusion, inplace=True, copy=False)
+    
+    # Measure
+    if measure:
+        qc.measure(range(n), range(n))
+    return qc
+
+
+def vqe_ansatz(num_qubits, reps=1, measure=False):
+    """
+    Hardware-efficient VQE ansatz with every angle in the ParameterVector 'theta'
+    reps x (RY and RZ rotation layers + CNOT chain), then a final RY layer,
+    so it has (2 * reps + 1) * num_qubits parameters.
+    """
+    from qiskit import QuantumCircuit
+    from qiskit.circuit import ParameterVector
+
+    theta = ParameterVector('theta', (2 * reps + 1) * num_qubits)
+    qc = QuantumCircuit(num_qubits)
+    
+    for rep in range(reps):
+        offset = 2 * rep * num_qubits
+        
+        # Rotation layers
+        for q in range(num_qubits):
+            qc.ry(theta[offset + q], q)
+        for q in range(num_qubits):
+            qc.rz(theta[offset + num_qubits + q], q)
+        
+        # Entanglement
+        for q in range(num_qubits - 1):
+            qc.cx(q, q + 1)
+    
+    # Final rotations
+    for q in range(num_qubits):
+        qc.ry(theta[2 * reps * num_qubits + q], q)
+    
+    # Measure energy expectation (sampled mode)
+    if measure:
+        qc.measure_all()
+    return qc
+
+
+def hamiltonian_operator(num_qubits, hamiltonian=None):
+    """
+    SparsePauliOp for a caller-defined Hamiltonian
+    hamiltonian is {label: coefficient} or [[label, coefficient], ...] with
+    qiskit labels (rightmost character acts on qubit 0). The default is the
+    fuel Hamiltonian: the fraction of qubits in |1⟩, sum_i (I - Z_i) / 2n,
+    whose energy lies in [0, 1].
+    """
+    from qiskit.quantum_info import SparsePauliOp
+    
+    if hamiltonian is None:
+        pauli_list = [('I' * num_qubits, 0.5)]
+        for i in range(num_qubits):
+            pauli_list.append(('I' * (num_qubits - i - 1) + 'Z' + 'I' * i, -0.5 / num_qubits))
+        return SparsePauliOp.from_list(pauli_list)
+    
+    terms = list(hamiltonian.items()) if isinstance(hamiltonian, dict) else [tuple(term) for term in hamiltonian]
+    if not terms:
+        raise ValueError("hamiltonian needs at least one term")
+    for label, coeff in terms:
+        if len(label) != num_qubits or set(label) - set('IXYZ'):
+            raise ValueError(f"Pauli label {label!r} must be {num_qubits} characters of I, X, Y, Z")
+        if not isinstance(coeff, (int, float)):
+            raise ValueError(f"coefficient of {label!r} must be a real number")
+    return SparsePauliOp.from_list([(label, float(coeff)) for label, coeff in terms]).simplify()
+
+
+def spsa_minimize(energies, x0, maxiter=100, seed=None, perturbation=0.1, callback=None):
+    """
+    Simultaneous perturbation stochastic approximation (Spall's gains)
+    energies maps a (k, P) array of parameter points to k energies, so each
+    iteration is one call with the two perturbed points. The learning rate
+    is calibrated for first steps of about 0.2 rad. Returns
+    (best point, best energy, per-iteration history, number of evaluations).
+    """
+    rng = np.random.default_rng(seed)
+    x = np.array(x0, dtype=float)
+    alpha, gamma = 0.602, 0.101
+    stability = 0.1 * maxiter
+    
+    deltas = rng.choice([-1.0, 1.0], size=(5, x.size))
+    values = energies(np.concatenate([x + perturbation * deltas, x - perturbation * deltas]))
+    nfev = 10
+    gradient = np.mean(np.abs(values[:5] - values[5:])) / (2 * perturbation)
+    learning_rate = 0.2 * (stability + 1)**alpha / max(gradient, 1e-10)
+    
+    history = []
+    best_x, best_energy = x.copy(), np.inf
+    for k in range(maxiter):
+        a = learning_rate / (k + 1 + stability)**alpha
+        c = perturbation / (k + 1)**gamma
+        delta = rng.choice([-1.0, 1.0], size=x.size)
+        plus, minus = energies(np.array([x + c * delta, x - c * delta]))
+        nfev += 2
+        
+        # The mean of the two probes estimates the energy at x before the step
+        energy = float(0.5 * (plus + minus))
+        history.append(energy)
+        if energy < best_energy:
+            best_x, best_energy = x.copy(), energy
+        x = x - a * (plus - minus) / (2 * c) * delta
+        if callback is not None:
+            callback(iteration=k + 1, energy=energy, nfev=nfev)
+    
+    final = float(energies(x[np.newaxis])[0])
+    nfev += 1
+    if final <= best_energy:
+        best_x, best_energy = x, final
+    return best_x, best_energy, history, nfev
+
+
+def phase_estimation_circuit(counting_qubits, measure=True):
+    """QPE template, the unitary phase is the free Parameter 'phase'"""
+    from qiskit import QuantumCircuit
+    from qiskit.circuit import Parameter
+    from qiskit.circuit.library import QFT
+
+    phase = Parameter('phase')
+    qc = QuantumCircuit(counting_qubits + 1, counting_qubits)
+    
+    # Initialize eigenstate |1⟩
+    qc.x(counting_qubits)
+    
+    # Create superposition in counting qubits
+    for q in range(counting_qubits):
+        qc.h(q)
+    
+    # Controlled unitary operations
+    for q in range(counting_qubits):
+        power = 2 ** q
+        qc.cp(phase * power, q, counting_qubits)
+    
+    # Inverse QFT on counting qubits
+    qc.append(QFT(counting_qubits, inverse=True), range(counting_qubits))
+    
+    # Measure counting qubits
+    if measure:
+        qc.measure(range(counting_qubits), range(counting_qubits))
+    return qc
+
+
+def phase_estimation_sweep_circuit(counting_qubits, measure=True):
+    """QPE template for parameter_binds sweeps
+
+    Aer ignores bound values on parameterized 'cp' gates, so the controlled
+    unitaries are written out as phase and CNOT gates.
+    """
+    return phase_estimation_circuit(counting_qubits, measure).decompose(gates_to_decompose=['cp'])
+
+
+def output_qubits(transpiled, qargs):
+    """Positions of the virtual qubits qargs at the end of a transpiled circuit (elided swaps permute them)"""
+    if transpiled.layout is None:
+        return list(qargs)
+    final = transpiled.layout.final_index_layout()
+    return [final[q] for q in qargs]
+
+
+def check_num_qubits(algorithm, num_qubits, maximum):
+    """Reject a width that is not an integer from 1 to maximum before any 2^n sized state is built"""
+    if isinstance(num_qubits, bool) or not isinstance(num_qubits, (int, np.integer)) or \
+            not 1 <= num_qubits <= maximum:
+        raise ValueError(f"{algorithm} needs an integer number of qubits from 1 to {maximum}, got {num_qubits!r}")
+    return int(num_qubits)
+
+
+def exact_distribution(circuit, bind=None, qargs=None):
+    """Exact measurement probabilities from the statevector of an unmeasured circuit
+
+    Keys are bitstrings in the same order as Aer counts, zero entries are dropped.
+    """
+    from qiskit.quantum_info import Statevector
+
+    if bind is not None:
+        circuit = circuit.assign_parameters(bind)
+    probabilities = Statevector(circuit).probabilities_dict(qargs=qargs, decimals=15)
+    return {str(k): float(p) for k, p in probabilities.items()}
+
+
+class CircuitCache:
+    """Bounded LRU of transpiled circuits keyed on canonical request parameters
+
+    Entries are (circuit, transpiled) pairs. Parameterized templates are
+    stored unbound and bound per request, so a phase change is a hit.
+    memo() stores any other deterministic entry, the backend keeps exact
+    distributions in a second instance so per-phase results never evict
+    the templates. Safe to share between request threads.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # transpile() rebuilds the Aer target for every call, keep one pass manager per backend
+        self.pass_manager = None
+        self.pass_manager_backend = None
+        self.transpile_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.transpiles = 0
+        self.transpile_time = 0.0
+
+    def get(self, key, build, backend):
+        """Return (circuit, transpiled) for key, calling build() and transpiling on a miss"""
+        return self.get_many([(key, build)], backend)[0]
+
+    def get_many(self, requests, backend):
+        """(circuit, transpiled) for every (key, build) pair, all misses transpiled in one call"""
+        found = {}
+        missing = OrderedDict()
+        with self.lock:
+            for key, build in requests:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    found[key] = entry
+                else:
+                    self.misses += 1
+                    missing.setdefault(key, build)
+
+        if missing:
+            # Build outside the lock, a racing duplicate just costs one extra transpile
+            circuits = [build() for build in missing.values()]
+            start = time.perf_counter()
+            transpiled = self.transpile(circuits, backend)
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.transpiles += len(circuits)
+                self.transpile_time += elapsed
+            for key, entry in zip(missing, zip(circuits, transpiled)):
+                self.put(key, entry)
+                found[key] = entry
+        return [found[key] for key, _ in requests]
+
+    def transpile(self, circuits, backend):
+        """Transpile a list of circuits with the preset pass manager of backend (what qiskit.transpile runs)"""
+        from qiskit.transpiler import generate_preset_pass_manager
+
+        with self.transpile_lock:
+            if self.pass_manager_backend is not backend:
+                self.pass_manager = generate_preset_pass_manager(backend=backend)
+                self.pass_manager_backend = backend
+            return self.pass_manager.run(circuits)
+
+    def memo(self, key, compute):
+        """Return the entry for key, storing compute() on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Compute outside the lock, a racing duplicate just costs one extra build
+        entry = compute()
+        self.put(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def info(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'transpiles': self.transpiles,
+                'transpile_time': self.transpile_time,
+                'mean_transpile_time': self.transpile_time / self.transpiles if self.transpiles else 0.0
+            }
+
+
+class CircuitNotFound(KeyError):
+    """The id does not encode a circuit this server can build"""
+
+
+class CircuitDrawings:
+    """Text drawings of executed circuits, rendered only when asked for
+
+    Responses carry a self-describing circuit_id: the task key plus bound
+    values as compact JSON, zlib-compressed and base64url-encoded. Any
+    server process can decode it and rebuild the circuit through
+    rebuild(key), which returns build(measure), so an id does not depend
+    on the worker or the run that issued it. draw() renders on first use
+    and keeps the text in its own LRU. Safe to share between request
+    threads.
+    """
+
+    def __init__(self, rebuild, max_drawings=256):
+        self.rebuild = rebuild
+        self.max_drawings = max_drawings
+        self.drawings = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+        self.render_time = 0.0
+
+    @staticmethod
+    def circuit_id(key, bind=None):
+        """Encode a task key and its bound values as a circuit_id"""
+        bind = None if bind is None else [float(value) for value in bind]
+        text = json.dumps([key, bind], separators=(',', ':'), default=quantum_jobs.to_json)
+        return base64.urlsafe_b64encode(zlib.compress(text.encode(), 9)).rstrip(b'=').decode()
+
+    @staticmethod
+    def decode(circuit_id):
+        """(key, bind) encoded in a circuit_id, CircuitNotFound if it is not one"""
+        try:
+            data = base64.urlsafe_b64decode(circuit_id + '=' * (-len(circuit_id) % 4))
+            key, bind = json.loads(zlib.decompress(data))
+            # JSON turns the tuples inside a key (e.g. Grover targets) into lists
+            key = tuple(tuple(part) if isinstance(part, list) else part for part in key)
+        except (ValueError, TypeError, zlib.error):
+            raise CircuitNotFound(circuit_id)
+        return key, bind
+
+    def draw(self, circuit_id):
+        """Text drawing of the measured circuit encoded in circuit_id"""
+        with self.lock:
+            text = self.drawings.get(circuit_id)
+            if text is not None:
+                self.drawings.move_to_end(circuit_id)
+                self.hits += 1
+                return text
+        key, bind = self.decode(circuit_id)
+        from qiskit.circuit.exceptions import CircuitError
+
+        # Render outside the lock, a racing duplicate just costs one extra drawing
+        start = time.perf_counter()
+        try:
+            circuit = self.rebuild(key)(True)
+            if bind is not None:
+                circuit = circuit.assign_parameters(bind)
+        except (ValueError, TypeError, IndexError, CircuitError):
+            # Not a circuit this server would run, e.g. arguments outside its limits
+            raise CircuitNotFound(circuit_id)
+        text = circuit.draw(output='text').single_string()
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.renders += 1
+            self.render_time += elapsed
+            self.drawings[circuit_id] = text
+            while len(self.drawings) > self.max_drawings:
+                self.drawings.popitem(last=False)
+        return text
+
+    def info(self):
+        with self.lock:
+            return {
+                'drawings': len(self.drawings),
+                'max_drawings': self.max_drawings,
+                'hits': self.hits,
+                'renders': self.renders,
+                'render_time': self.render_time
+            }
+
+
+class CircuitTask:
+    """
+    One circuit to run and how to turn its distribution into a response
+    build(measure) returns the circuit, key names it without the bound
+    values, finish(exact, sampled, mode) builds the numeric result dict.
+    exact_engine picks how exact probabilities are computed: 'statevector'
+    (qiskit.quantum_info, no transpile), 'aer' (Aer statevector on the
+    cached transpiled circuit, for wide multi-controlled gates) or
+    'kernel' (kernel() returns the probability array, see
+    quantum_kernels). sampled_engine is 'aer' (shots of the circuit) or
+    'kernel' (drawn from the kernel probabilities, so the task never
+    reaches a circuit). compile(measure), when given, returns the backend circuit
+    directly (e.g. composed from cached transpiled blocks) and replaces
+    the transpile of build(measure).
+    """
+
+    def __init__(self, key, build, finish, bind=None, qargs=None, exact_engine='statevector', kernel=None,
+                 compile=None, sampled_engine='aer'):
+        self.key = key
+        self.build = build
+        self.finish = finish
+        self.bind = bind
+        self.qargs = qargs
+        self.exact_engine = exact_engine
+        self.kernel = kernel
+        self.compile = compile
+        self.sampled_engine = sampled_engine
+
 
 class QuantumNavigationBackend:
-    """Real quantum computing backend using Qiskit"""
+    """Real quantum computing backend using Qiskit
+
+    Every algorithm takes mode='sampled' (Aer shots, the default), 'exact'
+    (statevector probabilities, no measurement or transpile) or 'both'
+    (exact results plus the sampled frequencies under 'sampled_*' keys).
+    Grover search also takes engine='numpy', a native statevector kernel
+    that skips circuit simulation (quantum_kernels). Results identify
+    their circuit by circuit_id; the text drawing is only rendered with
+    include_circuit=True or through /api/quantum/circuit/<circuit_id>.
+    Each circuit algorithm is a prepare_* step returning a CircuitTask, so
+    single calls and run_batch share one execution path. VQE is iterative
+    and runs its own optimization loop over a cached parameterized ansatz.
+    """
+
+    MODES = ('sampled', 'exact', 'both')
+    ENGINES = ('aer', 'numpy')
     
-    def __init__(self):
-        self.backend = simulator
+    def __init__(self, cache_size=256, max_batch=256, aer_threads=None, exact_cache_size=1024, max_runs=None):
+        self._backend = None
+        self.aer_threads = aer_threads
+        self.max_runs = max_runs
+        # Request and job threads share the simulator, at most max_runs Aer runs at a time
+        self.run_slots = threading.BoundedSemaphore(max_runs) if max_runs else None
         self.shots = 1024
+        self.max_batch = max_batch
+        self.cache = CircuitCache(cache_size)
+        # Exact distributions, keyed with their bound values
+        self.exact_cache = CircuitCache(exact_cache_size)
+        self.drawings = CircuitDrawings(self.circuit_builder)
+
+    @property
+    def backend(self):
+        """Qiskit simulator, created on first use (can switch to real IBM Quantum hardware)
+
+        aer_threads caps the threads one Aer run may use and max_runs the
+        runs at once (see simulate), so several server processes and their
+        request threads do not oversubscribe the cores.
+        """
+        if self._backend is None:
+            from qiskit_aer import AerSimulator
+            options = {'max_parallel_threads': self.aer_threads} if self.aer_threads else {}
+            self._backend = AerSimulator(**options)
+        return self._backend
+
+    def simulate(self, circuits, **options):
+        """backend.run(circuits, **options).result(), waiting for a free run slot first"""
+        if self.run_slots is None:
+            return self.backend.run(circuits, **options).result()
+        with self.run_slots:
+            return self.backend.run(circuits, **options).result()
+
+    def warm_up(self, num_qubits=3):
+        """Create the simulator and compile the default circuits, so first requests are cache hits"""
+        tasks = [self.prepare_superposition(num_qubits), self.prepare_grover(num_qubits),
+                 self.prepare_phase_estimation(num_qubits)]
+        self.execute(tasks, ['both'] * len(tasks))
+
+    def execute(self, tasks, modes, include_circuit=None):
+        """
+        Run CircuitTasks, each in its own mode, and return their results in order
+        Exact parts come from the exact result cache or the task's kernel.
+        All sampled circuits are transpiled in one call (cache misses only)
+        and submitted as one Aer job. Kernel engines never reach Aer. include_circuit is a list of flags
+        adding the circuit drawing to the matching result.
+        """
+        for mode in modes:
+            if mode not in self.MODES:
+                raise ValueError(f"mode must be one of {', '.join(self.MODES)}, got {mode!r}")
+        exact = [None] * len(tasks)
+        sampled = [None] * len(tasks)
+        
+        for k, (task, mode) in enumerate(zip(tasks, modes)):
+            exact_kernel = mode != 'sampled' and task.exact_engine == 'kernel'
+            sampled_kernel = mode != 'exact' and task.sampled_engine == 'kernel'
+            if exact_kernel or sampled_kernel:
+                probabilities = task.kernel()
+                num_bits = len(probabilities).bit_length() - 1
+                if exact_kernel:
+                    exact[k] = quantum_kernels.probability_dict(probabilities, num_bits)
+                if sampled_kernel:
+                    sampled[k] = quantum_kernels.sample_frequencies(probabilities, self.shots, num_bits)
+            if mode != 'sampled' and task.exact_engine != 'kernel':
+                # Deterministic, so the probabilities themselves are cached
+                key = task.key + (tuple(task.bind) if task.bind is not None else ())
+                if task.exact_engine == 'aer':
+                    exact[k] = self.exact_cache.memo(key, lambda task=task: self.aer_distribution(task))
+                else:
+                    exact[k] = self.exact_cache.memo(
+                        key, lambda task=task: exact_distribution(task.build(False), task.bind, task.qargs))
+        
+        runs = [k for k, mode in enumerate(modes) if mode != 'exact' and tasks[k].sampled_engine == 'aer']
+        if runs:
+            experiments = []
+            for k, transpiled in zip(runs, self.compiled([tasks[k] for k in runs], True)):
+                if tasks[k].bind is not None:
+                    transpiled = transpiled.assign_parameters(tasks[k].bind)
+                experiments.append(transpiled)
+            
+            # Let Aer spread a batch over its threads, one experiment per thread
+            options = {'max_parallel_experiments': 0} if len(experiments) > 1 else {}
+            result = self.simulate(experiments, shots=self.shots, **options)
+            for i, k in enumerate(runs):
+                counts = result.get_counts(i)
+                sampled[k] = {state: count/self.shots for state, count in counts.items()}
+        
+        results = []
+        for k, task in enumerate(tasks):
+            results.append(task.finish(exact[k], sampled[k], modes[k]))
+            self.identify(results[-1], task.key, task.bind, include_circuit and include_circuit[k])
+        return results
+
+    def identify(self, result, key, bind=None, include_circuit=False):
+        """Add circuit_id (and the drawing when asked for) to a result"""
+        result['circuit_id'] = self.drawings.circuit_id(key, bind)
+        if include_circuit:
+            result['circuit'] = self.drawings.draw(result['circuit_id'])
+        return result
+
+    def circuit_builder(self, key):
+        """
+        build(measure) for the circuit a task key names
+        Goes through the prepare_* step, so a decoded circuit_id gets the
+        same argument checks as a request.
+        """
+        name, args = key[0], key[1:]
+        if name == 'superposition':
+            return self.prepare_superposition(*args).build
+        if name == 'grover':
+            num_qubits, targets, iterations = args
+            return self.prepare_grover(num_qubits, list(targets), iterations).build
+        if name == 'phase_estimation':
+            return self.prepare_phase_estimation(*args).build
+        if name == 'vqe_ansatz':
+            num_qubits, reps = self.check_vqe_ansatz(*args)
+            return lambda measure: vqe_ansatz(num_qubits, reps, measure)
+        raise ValueError(f"no circuit is named {name!r}")
+
+    def compiled(self, tasks, measure):
+        """
+        Cached backend circuit of every task
+        All misses among plain tasks are transpiled in one call, tasks with
+        compile() assemble their circuit themselves.
+        """
+        prefix = () if measure else ('unmeasured',)
+        circuits = [None] * len(tasks)
+        plain = [k for k, task in enumerate(tasks) if task.compile is None]
+        requests = [(prefix + tasks[k].key, lambda task=tasks[k]: task.build(measure)) for k in plain]
+        for k, (_, transpiled) in zip(plain, self.cache.get_many(requests, self.backend)):
+            circuits[k] = transpiled
+        for k, task in enumerate(tasks):
+            if task.compile is not None:
+                circuits[k] = self.cache.memo(prefix + task.key, lambda task=task: task.compile(measure))
+        return circuits
+
+    def aer_distribution(self, task):
+        """Exact probabilities of an unmeasured task circuit from the Aer statevector"""
+        import qiskit_aer  # adds QuantumCircuit.save_probabilities_dict
+        
+        transpiled = self.compiled([task], False)[0]
+        if task.bind is not None:
+            transpiled = transpiled.assign_parameters(task.bind)
+        else:
+            transpiled = transpiled.copy()
+        qargs = task.qargs if task.qargs is not None else list(range(transpiled.num_qubits))
+        transpiled.save_probabilities_dict(output_qubits(transpiled, qargs))
+        probabilities = self.simulate(transpiled, shots=1).data(0)['probabilities']
+        return {format(int(state), f'0{len(qargs)}b'): float(p) for state, p in probabilities.items()}
+
+    def prepare(self, job):
+        """CircuitTask for one API-style request {'algorithm': ..., parameters...}, VQE excluded"""
+        algorithm = job.get('algorithm')
+        if algorithm == 'superposition':
+            return self.prepare_superposition(job.get('num_qubits', 3))
+        if algorithm == 'grover':
+            return self.prepare_grover(job.get('num_qubits', 3), job.get('target_states', [1, 3]),
+                                       job.get('iterations'), job.get('engine', 'aer'))
+        if algorithm == 'phase_estimation':
+            return self.prepare_phase_estimation(job.get('num_qubits', 3), job.get('phase', np.pi/4))
+        raise ValueError(f"unknown algorithm {algorithm!r}")
+
+    def run_batch(self, jobs):
+        """
+        Run a list of request dicts (see prepare) in one Aer submission, results in request order
+        VQE requests are iterative, they run one after another after the batch.
+        """
+        if len(jobs) > self.max_batch:
+            raise ValueError(f"batch of {len(jobs)} requests exceeds the limit of {self.max_batch}")
+        tasks = []
+        for index, job in enumerate(jobs):
+            if job.get('algorithm') == 'vqe':
+                continue
+            try:
+                tasks.append(self.prepare(job))
+            except ValueError as error:
+                raise ValueError(f"request {index}: {error}")
+        circuit_jobs = [job for job in jobs if job.get('algorithm') != 'vqe']
+        circuits = iter(self.execute(tasks, [job.get('mode', 'sampled') for job in circuit_jobs],
+                                     [job.get('include_circuit', False) for job in circuit_jobs]))
         
-    def create_superposition(self, num_qubits=3):
+        results = []
+        for index, job in enumerate(jobs):
+            if job.get('algorithm') != 'vqe':
+                results.append(next(circuits))
+                continue
+            try:
+                results.append(self.vqe_request(job))
+            except ValueError as error:
+                raise ValueError(f"request {index}: {error}")
+        return results
+        
+    MAX_SUPERPOSITION_QUBITS = 20
+    
+    def prepare_superposition(self, num_qubits=3):
+        num_qubits = check_num_qubits('superposition', num_qubits, self.MAX_SUPERPOSITION_QUBITS)
+        
+        def finish(exact, sampled, mode):
+            result = {
+                'probabilities': exact if exact is not None else sampled,
+                'num_qubits': num_qubits,
+                'backend': str(self.backend) if sampled is not None else 'statevector',
+                'mode': mode
+            }
+            if mode == 'both':
+                result['sampled_probabilities'] = sampled
+            return result
+        
+        return CircuitTask(('superposition', num_qubits), lambda measure: superposition_circuit(num_qubits, measure), finish)
+        
+    def create_superposition(self, num_qubits=3, mode='sampled', include_circuit=False):
         """
         Create quantum superposition for environment prediction
         Returns probability distribution over all states
         """
-        qc = QuantumCircuit(num_qubits, num_qubits)
+        return self.execute([self.prepare_superposition(num_qubits)], [mode], [include_circuit])[0]
+    
+    MAX_GROVER_QUBITS = {'aer': 20, 'numpy': 24}
+    MAX_GROVER_ITERATIONS_FACTOR = 4
+    
+    def prepare_grover(self, num_qubits=3, target_states=[1, 3], iterations=None, engine='aer'):
+        if engine not in self.ENGINES:
+            raise ValueError(f"engine must be one of {', '.join(self.ENGINES)}, got {engine!r}")
+        n = check_num_qubits(f"grover on {engine}", num_qubits, self.MAX_GROVER_QUBITS[engine])
         
-        # Apply Hadamard gates to create superposition
-        for q in range(num_qubits):
-            qc.h(q)
+        # One oracle for the whole marked set, the order of the targets does not matter
+        targets = sorted(set(int(target) for target in target_states))
+        if not targets or targets[0] < 0 or targets[-1] >= 2**n:
+            raise ValueError(f"target_states must be a non-empty list of states 0..{2**n - 1}")
         
-        # Apply phase gates for interference
-        for q in range(num_qubits):
-            phase = (q * np.pi) / num_qubits
-            qc.p(phase, q)
+        # Number of Grover iterations, past the optimum they only rotate the state further around
+        optimal = quantum_kernels.grover_iterations(n, len(targets))
+        max_iterations = self.MAX_GROVER_ITERATIONS_FACTOR * max(optimal, 1)
+        if iterations is None:
+            iterations = optimal
+        elif isinstance(iterations, bool) or not isinstance(iterations, (int, np.integer)) or \
+                not 0 <= iterations <= max_iterations:
+            raise ValueError(f"iterations must be an integer from 0 to {max_iterations} "
+                             f"({self.MAX_GROVER_ITERATIONS_FACTOR} x the optimal {optimal}), got {iterations!r}")
+        iterations = int(iterations)
         
-        # Create entanglement with CNOT gates
-        for q in range(num_qubits - 1):
-            qc.cx(q, q + 1)
+        def blocks():
+            """Oracle and diffusion as (circuit, transpiled) pairs, transpiled once per marked set and width"""
+            oracle = self.cache.get(('grover_oracle', n, tuple(targets)), lambda: grover_oracle(n, targets),
+                                    self.backend)
+            diffusion = self.cache.get(('grover_diffusion', n), lambda: grover_diffusion(n), self.backend)
+            return oracle, diffusion
         
-        # Measure all qubits
-        qc.measure(range(num_qubits), range(num_qubits))
+        def build(measure):
+            oracle, diffusion = blocks()
+            return grover_circuit(n, oracle[0], iterations, measure, diffusion[0])
         
-        # Execute on quantum backend
-        transpiled = transpile(qc, self.backend)
-        job = self.backend.run(transpiled, shots=self.shots)
-        result = job.result()
-        counts = result.get_counts()
+        def compile(measure):
+            # Only the small blocks go through the transpiler, the iterations are composed
+            oracle, diffusion = blocks()
+            return grover_circuit(n, oracle[1], iterations, measure, diffusion[1])
         
-        # Convert to probability distribution
-        probabilities = {}
-        for state, count in counts.items():
-            probabilities[state] = count / self.shots
+        def finish(exact, sampled, mode):
+            probabilities = exact if exact is not None else sampled
+            
+            # Find most probable state
+            max_state = max(probabilities, key=probabilities.get)
+            
+            result = {
+                'found_state': int(max_state, 2),
+                'probability': probabilities[max_state],
+                'success_probability': sum(probabilities.get(format(target, f'0{n}b'), 0.0) for target in targets),
+                'iterations': iterations,
+                'all_counts': probabilities,
+                'target_states': targets,
+                'mode': mode,
+                'engine': engine
+            }
+            if mode == 'both':
+                result['sampled_counts'] = sampled
+            return result
         
-        return {
-            'circuit': qc.draw('text', output='text'),
-            'probabilities': probabilities,
-            'num_qubits': num_qubits,
-            'backend': str(self.backend)
-        }
+        key = ('grover', n, tuple(targets), iterations)
+        kernel = lambda: quantum_kernels.grover_probabilities(n, targets, iterations)
+        if engine == 'numpy':
+            return CircuitTask(key, build, finish, exact_engine='kernel', kernel=kernel, sampled_engine='kernel')
+        # The exact distribution is the kernel's on either engine, only the shots need the circuit
+        return CircuitTask(key, build, finish, exact_engine='kernel', kernel=kernel, compile=compile)
     
-    def grover_search(self, num_qubits=3, target_states=[1, 3]):
+    def grover_search(self, num_qubits=3, target_states=[1, 3], mode='sampled', iterations=None, engine='aer',
+                      include_circuit=False):
         """
         Grover's Algorithm for optimal route search
         Finds target states with O(√N) complexity
-        """
-        n = num_qubits
-        qc = QuantumCircuit(n, n)
-        
-        # Initialize superposition
-        qc.h(range(n))
-        
-        # Number of Grover iterations
-        iterations = int(np.pi / 4 * np.sqrt(2**n))
-        
-        for _ in range(iterations):
-            # Oracle: Mark target states
-            for target in target_states:
-                # Convert target to binary
-                binary = format(target, f'0{n}b')
-                
-                # Apply X gates where bit is 0
-                for i, bit in enumerate(binary):
-                    if bit == '0':
-                        qc.x(i)
-                
-                # Multi-controlled Z gate
-                if n == 3:
-                    qc.ccz(0, 1, 2)
-                elif n == 2:
-                    qc.cz(0, 1)
-                
-                # Undo X gates
-                for i, bit in enumerate(binary):
-                    if bit == '0':
-                        qc.x(i)
-            
-            # Diffusion operator
-            qc.h(range(n))
-            qc.x(range(n))
-            
-            if n == 3:
-                qc.ccz(0, 1, 2)
-            elif n == 2:
-                qc.cz(0, 1)
-            
-            qc.x(range(n))
-            qc.h(range(n))
         
-        # Measure
-        qc.measure(range(n), range(n))
-        
-        # Execute
-        transpiled = transpile(qc, self.backend)
-        job = self.backend.run(transpiled, shots=self.shots)
-        result = job.result()
-        counts = result.get_counts()
-        
-        # Find most probable state
-        max_state = max(counts, key=counts.get)
-        max_prob = counts[max_state] / self.shots
-        
-        return {
-            'circuit': qc.draw('text', output='text'),
-            'found_state': int(max_state, 2),
-            'probability': max_prob,
-            'iterations': iterations,
-            'all_counts': {k: v/self.shots for k, v in counts.items()},
-            'target_states': target_states
-        }
+        Any width up to MAX_GROVER_QUBITS, any number M of marked states,
+        floor(π/4 · √(N/M)) iterations unless given (at most
+        MAX_GROVER_ITERATIONS_FACTOR times that). Exact probabilities always
+        come from the NumPy kernel, engine='numpy' also draws the shots from
+        it instead of simulating the circuit.
+        """
+        return self.execute([self.prepare_grover(num_qubits, target_states, iterations, engine)], [mode],
+                            [include_circuit])[0]
+    
+    MAX_VQE_QUBITS = 16
+    MAX_VQE_REPS = 10
+    
+    def check_vqe_ansatz(self, num_qubits, reps):
+        """(num_qubits, reps) of an ansatz within MAX_VQE_QUBITS and MAX_VQE_REPS, ValueError otherwise"""
+        num_qubits = check_num_qubits('vqe', num_qubits, self.MAX_VQE_QUBITS)
+        if isinstance(reps, bool) or not isinstance(reps, (int, np.integer)) or not 0 <= reps <= self.MAX_VQE_REPS:
+            raise ValueError(f"reps must be an integer from 0 to {self.MAX_VQE_REPS}, got {reps!r}")
+        return num_qubits, int(reps)
+    
+    VQE_ARGUMENTS = ('num_qubits', 'hamiltonian', 'optimizer', 'maxiter', 'reps', 'initial_point', 'seed', 'mode',
+                     'include_circuit')
     
-    def vqe_optimization(self, num_qubits=4):
+    def vqe_optimization(self, num_qubits=4, hamiltonian=None, optimizer='COBYLA', maxiter=100, reps=1,
+                         initial_point=None, seed=None, mode='exact', callback=None, include_circuit=False):
         """
         Variational Quantum Eigensolver for fuel optimization
         Finds minimum energy configuration
+        
+        The ansatz is built and cached once, every energy evaluation only
+        binds new angles. mode='exact' evaluates <H> with the statevector
+        Estimator, 'sampled' runs the transpiled ansatz on Aer (diagonal
+        I/Z Hamiltonians only), 'both' optimizes exactly and adds the
+        sampled energy at the optimum. callback(iteration=, energy=, nfev=)
+        is called after every iteration.
         """
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {', '.join(self.MODES)}, got {mode!r}")
+        if optimizer not in ('COBYLA', 'SPSA'):
+            raise ValueError(f"optimizer must be COBYLA or SPSA, got {optimizer!r}")
+        num_qubits, reps = self.check_vqe_ansatz(num_qubits, reps)
+        
         # Define Hamiltonian (energy function)
         # For satellite navigation: energy = fuel consumption
-        from qiskit.quantum_info import SparsePauliOp
-        
-        # Simple Hamiltonian: sum of Pauli Z operators
-        pauli_list = []
-        for i in range(num_qubits):
-            pauli_list.append(('Z' + 'I' * i + 'I' * (num_qubits - i - 1), 1.0))
-        
-        hamiltonian = SparsePauliOp.from_list(pauli_list)
-        
-        # Create ansatz (parameterized quantum circuit)
-        qc = QuantumCircuit(num_qubits)
-        
-        # Layer 1: Rotation gates
-        for q in range(num_qubits):
-            qc.ry(np.pi/4, q)
-        
-        # Layer 2: Entanglement
-        for q in range(num_qubits - 1):
-            qc.cx(q, q + 1)
+        operator = hamiltonian_operator(num_qubits, hamiltonian)
+        diagonal = not operator.paulis.x.any()
+        if mode != 'exact' and not diagonal:
+            raise ValueError("sampled VQE energies need a diagonal (I/Z only) hamiltonian, use mode='exact'")
         
-        # Layer 3: More rotations
-        for q in range(num_qubits):
-            qc.rz(np.pi/3, q)
+        ansatz = self.cache.memo(('vqe_ansatz', num_qubits, reps), lambda: vqe_ansatz(num_qubits, reps))
+        if initial_point is None:
+            initial_point = np.random.default_rng(seed).uniform(-np.pi, np.pi, ansatz.num_parameters)
+        initial_point = np.asarray(initial_point, dtype=float)
+        if initial_point.shape != (ansatz.num_parameters,):
+            raise ValueError(f"initial_point needs {ansatz.num_parameters} angles for {num_qubits} qubits and reps={reps}")
         
-        # Simplified VQE (classical optimization of quantum circuit)
-        # In production, use qiskit.algorithms.VQE
+        def exact_energies(points):
+            from qiskit.primitives import StatevectorEstimator
+            
+            result = StatevectorEstimator().run([(ansatz, operator, points)]).result()
+            return np.real(result[0].data.evs)
         
-        # Measure energy expectation
-        qc_copy = qc.copy()
-        qc_copy.measure_all()
+        if mode != 'exact':
+            _, transpiled = self.cache.get(('vqe', num_qubits, reps), lambda: vqe_ansatz(num_qubits, reps, measure=True),
+                                           self.backend)
+            levels = np.real(operator.to_matrix(sparse=True).diagonal())
         
-        transpiled = transpile(qc_copy, self.backend)
-        job = self.backend.run(transpiled, shots=self.shots)
-        result = job.result()
-        counts = result.get_counts()
+        def sampled_energies(points):
+            # Energy of each bitstring from the diagonal of H, one Aer job per call
+            experiments = [transpiled.assign_parameters(point) for point in points]
+            result = self.simulate(experiments, shots=self.shots)
+            energies = []
+            for i in range(len(experiments)):
+                counts = result.get_counts(i)
+                energies.append(sum(levels[int(state, 2)] * count for state, count in counts.items()) / self.shots)
+            return np.array(energies)
         
-        # Calculate energy (simplified)
-        energy = 0
-        for state, count in counts.items():
-            prob = count / self.shots
-            # Energy based on number of 1s (higher = more fuel)
-            ones = state.count('1')
-            energy += prob * ones
+        energies = sampled_energies if mode == 'sampled' else exact_energies
         
-        # Normalize energy to 0-1 range
-        energy = energy / num_qubits
+        # Classical optimization of the bound quantum circuit
+        if optimizer == 'SPSA':
+            optimal, energy, history, nfev = spsa_minimize(energies, initial_point, maxiter, seed, callback=callback)
+        else:
+            from scipy.optimize import minimize
+            
+            history = []
+            
+            def objective(point):
+                value = float(energies(point[np.newaxis])[0])
+                history.append(value)
+                if callback is not None:
+                    callback(iteration=len(history), energy=value, nfev=len(history))
+                return value
+            
+            solution = minimize(objective, initial_point, method='COBYLA', options={'maxiter': maxiter})
+            optimal, energy, nfev = solution.x, float(solution.fun), solution.nfev
         
-        return {
-            'circuit': qc.draw('text', output='text'),
+        result = {
             'minimum_energy': energy,
-            'fuel_savings': (1 - energy) * 100,
+            'optimal_parameters': optimal.tolist(),
+            'initial_energy': history[0] if history else energy,
+            'history': history,
+            'nfev': int(nfev),
+            'iterations': len(history),
             'num_qubits': num_qubits,
-            'optimizer': 'COBYLA'
+            'reps': reps,
+            'hamiltonian': [[label, float(np.real(coeff))] for label, coeff in operator.to_list()],
+            'optimizer': optimizer,
+            'mode': mode
         }
+        if hamiltonian is None:
+            # Default Hamiltonian: energy is the fraction of |1⟩ (fuel), 0-1
+            result['fuel_savings'] = (1 - energy) * 100
+        if mode == 'both':
+            result['sampled_energy'] = float(sampled_energies(optimal[np.newaxis])[0])
+        return self.identify(result, ('vqe_ansatz', num_qubits, reps), optimal, include_circuit)
+    
+    def vqe_request(self, job, callback=None):
+        """Run vqe_optimization for an API-style request dict"""
+        return self.vqe_optimization(**{name: job[name] for name in self.VQE_ARGUMENTS if name in job},
+                                     callback=callback)
     
-    def quantum_phase_estimation(self, num_qubits=3, phase=np.pi/4):
+    MAX_PHASE_ESTIMATION_QUBITS = 20
+    
+    def prepare_phase_estimation(self, num_qubits=3, phase=np.pi/4):
+        # Counting qubits + eigenstate qubit
+        counting_qubits = check_num_qubits('phase estimation', num_qubits, self.MAX_PHASE_ESTIMATION_QUBITS)
+        if isinstance(phase, bool) or not isinstance(phase, (int, float, np.integer, np.floating)) or \
+                not np.isfinite(phase):
+            raise ValueError(f"phase must be a finite number, got {phase!r}")
+        phase = float(phase)
+        
+        def finish(exact, sampled, mode):
+            result = {
+                'probabilities': exact if exact is not None else sampled,
+                'input_phase': phase,
+                'precision': 2**counting_qubits,
+                'num_qubits': counting_qubits,
+                'mode': mode
+            }
+            if mode == 'both':
+                result['sampled_probabilities'] = sampled
+            return result
+        
+        # One template per width, the phase is bound per request
+        return CircuitTask(('phase_estimation', counting_qubits),
+                           lambda measure: phase_estimation_circuit(counting_qubits, measure), finish,
+                           bind=[phase], qargs=list(range(counting_qubits)))
+    
+    def quantum_phase_estimation(self, num_qubits=3, phase=np.pi/4, mode='sampled', include_circuit=False):
         """
         Quantum Phase Estimation for trajectory prediction
         Estimates eigenvalues with exponential precision
         """
-        # Counting qubits + eigenstate qubit
-        counting_qubits = num_qubits
-        total_qubits = counting_qubits + 1
-        
-        qc = QuantumCircuit(total_qubits, counting_qubits)
-        
-        # Initialize eigenstate |1⟩
-        qc.x(counting_qubits)
+        return self.execute([self.prepare_phase_estimation(num_qubits, phase)], [mode], [include_circuit])[0]
+    
+    SWEEP_OUTPUTS = ('estimates', 'matrix')
+    MAX_SWEEP_CELLS = 2**24
+    
+    def sweep_distributions(self, counting_qubits, phases, shots=None):
+        """
+        Outcome matrix (len(phases), 2^counting_qubits) of the QPE template
+        bound to every phase in a single Aer job, exact probabilities when
+        shots is None, measured frequencies otherwise
+        """
+        import qiskit_aer  # adds QuantumCircuit.save_probabilities
         
-        # Create superposition in counting qubits
-        for q in range(counting_qubits):
-            qc.h(q)
+        size = 2**counting_qubits
+        measure = shots is not None
+        key = ('phase_estimation_sweep', counting_qubits)
+        circuit, transpiled = self.cache.get(key if measure else ('unmeasured',) + key,
+                                             lambda: phase_estimation_sweep_circuit(counting_qubits, measure),
+                                             self.backend)
+        binds = [{transpiled.parameters[0]: phases.tolist()}]
+        if not measure:
+            transpiled = transpiled.copy()
+            transpiled.save_probabilities(output_qubits(transpiled, range(counting_qubits)))
+            result = self.simulate(transpiled, shots=1, parameter_binds=binds)
+            return np.array([result.data(i)['probabilities'] for i in range(len(phases))]).reshape(-1, size)
         
-        # Controlled unitary operations
-        for q in range(counting_qubits):
-            power = 2 ** q
-            angle = phase * power
-            qc.cp(angle, q, counting_qubits)
+        result = self.simulate(transpiled, shots=shots, parameter_binds=binds)
+        matrix = np.zeros((len(phases), size))
+        for i in range(len(phases)):
+            for state, count in result.get_counts(i).items():
+                matrix[i, int(state, 2)] = count/shots
+        return matrix
+    
+    def phase_estimation_sweep(self, num_qubits=3, phases=[np.pi/4], mode='sampled', engine='aer', output='estimates',
+                               include_circuit=False):
+        """
+        Quantum Phase Estimation for many phases at once, e.g. one per tracked object
+        engine='aer' binds every phase into one template and runs one Aer job,
+        engine='numpy' evaluates the analytic QPE distribution instead.
+        output='estimates' returns the most likely outcome per phase,
+        'matrix' also the full probability matrix (rows follow phases,
+        columns follow 'states'). The circuit is the unbound template.
+        """
+        counting_qubits = check_num_qubits('phase estimation', num_qubits, self.MAX_PHASE_ESTIMATION_QUBITS)
+        size = 2**counting_qubits
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {', '.join(self.MODES)}, got {mode!r}")
+        if engine not in self.ENGINES:
+            raise ValueError(f"engine must be one of {', '.join(self.ENGINES)}, got {engine!r}")
+        if output not in self.SWEEP_OUTPUTS:
+            raise ValueError(f"output must be one of {', '.join(self.SWEEP_OUTPUTS)}, got {output!r}")
+        phases = np.asarray(phases, dtype=float).reshape(-1)
+        if phases.size == 0 or phases.size*size > self.MAX_SWEEP_CELLS:
+            raise ValueError(f"a sweep on {counting_qubits} qubits takes 1 to {self.MAX_SWEEP_CELLS // size} phases, "
+                             f"got {phases.size}")
+        if not np.all(np.isfinite(phases)):
+            raise ValueError("phases must be finite numbers")
         
-        # Inverse QFT on counting qubits
-        qc.append(QFT(counting_qubits, inverse=True), range(counting_qubits))
+        exact = sampled = None
+        if engine == 'numpy':
+            probabilities = quantum_kernels.phase_estimation_probabilities(phases, counting_qubits)
+            if mode != 'sampled':
+                exact = probabilities
+            if mode != 'exact':
+                sampled = quantum_kernels.sample_matrix(probabilities, self.shots)
+        else:
+            if mode != 'sampled':
+                exact = self.sweep_distributions(counting_qubits, phases)
+            if mode != 'exact':
+                sampled = self.sweep_distributions(counting_qubits, phases, self.shots)
         
-        # Measure counting qubits
-        qc.measure(range(counting_qubits), range(counting_qubits))
+        def summary(matrix):
+            best = matrix.argmax(axis=1)
+            result = {
+                'estimated_states': best.tolist(),
+                'estimated_phases': (2*np.pi*best/size).tolist(),
+                'confidence': matrix[np.arange(len(best)), best].tolist()
+            }
+            if output == 'matrix':
+                result['probabilities'] = matrix.tolist()
+            return result
         
-        # Execute
-        transpiled = transpile(qc, self.backend)
-        job = self.backend.run(transpiled, shots=self.shots)
-        result = job.result()
-        counts = result.get_counts()
-        
-        # Estimate phase
-        probabilities = {k: v/self.shots for k, v in counts.items()}
-        
-        return {
-            'circuit': qc.draw('text', output='text'),
-            'probabilities': probabilities,
-            'input_phase': phase,
-            'precision': 2**counting_qubits,
-            'num_qubits': counting_qubits
+        result = {
+            'input_phases': phases.tolist(),
+            'count': int(phases.size),
+            'precision': size,
+            'num_qubits': counting_qubits,
+            'mode': mode,
+            'engine': engine,
+            'output': output
         }
+        if output == 'matrix':
+            result['states'] = quantum_kernels.bitstrings(np.arange(size), counting_qubits)
+        result.update(summary(exact if exact is not None else sampled))
+        if mode == 'both':
+            result['sampled'] = summary(sampled)
+        return self.identify(result, ('phase_estimation', counting_qubits), None, include_circuit)
+    
+    SWEEP_ARGUMENTS = ('num_qubits', 'phases', 'mode', 'engine', 'output', 'include_circuit')
+    
+    def sweep_request(self, job):
+        """Run phase_estimation_sweep for an API-style request dict"""
+        return self.phase_estimation_sweep(**{name: job[name] for name in self.SWEEP_ARGUMENTS if name in job})
+
+
+# Initialize quantum backend, one per server process
+quantum_backend = QuantumNavigationBackend(aer_threads=int(os.environ.get('QUANTUM_AER_THREADS', 0)) or None,
+                                           max_runs=int(os.environ.get('QUANTUM_AER_RUNS', 0)) or None)
+
+# Long runs go through the job queue instead of the request thread
+job_manager = quantum_jobs.JobManager(max_workers=int(os.environ.get('QUANTUM_JOB_WORKERS', 2)),
+                                      max_jobs=int(os.environ.get('QUANTUM_MAX_JOBS', 1000)),
+                                      default_timeout=float(os.environ.get('QUANTUM_JOB_TIMEOUT', 300)),
+                                      max_timeout=float(os.environ.get('QUANTUM_MAX_JOB_TIMEOUT', 3600)),
+                                      # Shared by the server processes, so any of them answers for every job
+                                      store=(quantum_jobs.JobStore(os.environ['QUANTUM_JOB_DIR'])
+                                             if os.environ.get('QUANTUM_JOB_DIR') else None))
+
+# Set once the backend is warm, cleared again as soon as the server starts stopping
+ready = threading.Event()
+stopping = threading.Event()
+
+
+def warm_up():
+    """Warm this process's backend and start reporting ready"""
+    quantum_backend.warm_up()
+    ready.set()
+
 
+def stop_accepting():
+    """Report 'stopping' from now on, while the requests in flight still finish
 
-# Initialize quantum backend
-quantum_backend = QuantumNavigationBackend()
+    Safe to call from a signal handler, it only sets two flags.
+    """
+    stopping.set()
+    ready.clear()
+
+
+def shutdown():
+    """Stop reporting ready, cancel queued and running jobs and wait for the job workers"""
+    stop_accepting()
+    job_manager.shutdown(wait=True, cancel=True)
+
+
+def job_function(spec):
+    """Validate an async request now and return the callable a job worker runs"""
+    if spec.get('algorithm') == 'vqe':
+        # Per-iteration energies become progress events, cancellation stops the optimizer
+        return lambda job: quantum_backend.vqe_request(spec, callback=job.progress)
+    
+    if spec.get('algorithm') == 'phase_estimation_sweep':
+        return lambda job: quantum_backend.sweep_request(spec)
+    
+    if spec.get('algorithm') == 'batch':
+        jobs = spec.get('requests', [])
+        if len(jobs) > quantum_backend.max_batch:
+            raise ValueError(f"batch of {len(jobs)} requests exceeds the limit of {quantum_backend.max_batch}")
+        return lambda job: quantum_backend.run_batch(jobs)
+    
+    mode = spec.get('mode', 'sampled')
+    if mode not in quantum_backend.MODES:
+        raise ValueError(f"mode must be one of {', '.join(quantum_backend.MODES)}, got {mode!r}")
+    task = quantum_backend.prepare(spec)
+    return lambda job: quantum_backend.execute([task], [mode], [spec.get('include_circuit', False)])[0]
 
 
 # ============================================
 # REST API ENDPOINTS
 # ============================================
 
+@app.errorhandler(ValueError)
+def bad_request(error):
+    """Invalid parameters (e.g. an unknown mode) are client errors"""
+    return jsonify({'error': str(error)}), 400
+
+
+@app.errorhandler(quantum_jobs.JobNotFound)
+def job_not_found(error):
+    return jsonify({'error': f'unknown job {error.args[0]}'}), 404
+
+
+@app.errorhandler(quantum_jobs.QueueClosed)
+def queue_closed(error):
+    return jsonify({'error': str(error)}), 503
+
+
+@app.errorhandler(CircuitNotFound)
+def circuit_not_found(error):
+    return jsonify({'error': f"unknown circuit id {error.args[0]}"}), 404
+
+
+@app.errorhandler(quantum_jobs.QueueFull)
+def queue_full(error):
+    return jsonify({'error': str(error)}), 429
+
+
 @app.route('/api/quantum/superposition', methods=['POST'])
 def create_superposition():
     """Create quantum superposition for environment prediction"""
     data = request.json
     num_qubits = data.get('num_qubits', 3)
+    mode = data.get('mode', 'sampled')
+    include_circuit = data.get('include_circuit', False)
     
-    result = quantum_backend.create_superposition(num_qubits)
+    result = quantum_backend.create_superposition(num_qubits, mode, include_circuit)
     return jsonify(result)
 
 
@@ -273,8 +1204,12 @@ def run_grover():
     data = request.json
     num_qubits = data.get('num_qubits', 3)
     target_states = data.get('target_states', [1, 3])
+    mode = data.get('mode', 'sampled')
+    iterations = data.get('iterations')
+    engine = data.get('engine', 'aer')
+    include_circuit = data.get('include_circuit', False)
     
-    result = quantum_backend.grover_search(num_qubits, target_states)
+    result = quantum_backend.grover_search(num_qubits, target_states, mode, iterations, engine, include_circuit)
     return jsonify(result)
 
 
@@ -282,9 +1217,8 @@ def run_grover():
 def run_vqe():
     """Run VQE for fuel optimization"""
     data = request.json
-    num_qubits = data.get('num_qubits', 4)
     
-    result = quantum_backend.vqe_optimization(num_qubits)
+    result = quantum_backend.vqe_request(data)
     return jsonify(result)
 
 
@@ -294,11 +1228,92 @@ def run_phase_estimation():
     data = request.json
     num_qubits = data.get('num_qubits', 3)
     phase = data.get('phase', np.pi/4)
+    mode = data.get('mode', 'sampled')
+    include_circuit = data.get('include_circuit', False)
     
-    result = quantum_backend.quantum_phase_estimation(num_qubits, phase)
+    result = quantum_backend.quantum_phase_estimation(num_qubits, phase, mode, include_circuit)
+    return jsonify(result)
+
+
+@app.route('/api/quantum/phase_estimation/sweep', methods=['POST'])
+def run_phase_estimation_sweep():
+    """Run Quantum Phase Estimation for an array of phases, one per tracked object"""
+    data = request.json
+    result = quantum_backend.sweep_request(data)
     return jsonify(result)
 
 
+@app.route('/api/quantum/circuit/<circuit_id>', methods=['GET'])
+def get_circuit(circuit_id):
+    """Text drawing of a circuit returned earlier by its circuit_id"""
+    return jsonify({'circuit_id': circuit_id, 'circuit': quantum_backend.drawings.draw(circuit_id)})
+
+
+@app.route('/api/quantum/batch', methods=['POST'])
+def run_batch():
+    """Run many heterogeneous requests in one Aer submission"""
+    data = request.json
+    jobs = data.get('requests', [])
+    
+    results = quantum_backend.run_batch(jobs)
+    return jsonify({'results': results, 'count': len(results)})
+
+
+@app.route('/api/quantum/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a request and return its job id at once
+    Body: any algorithm request ({'algorithm': 'grover', ...}) or
+    {'algorithm': 'batch', 'requests': [...]}, plus an optional 'timeout' in seconds
+    """
+    data = request.json
+    run = job_function(data)
+    job = job_manager.submit(run, data.get('algorithm'), data.get('timeout'))
+    return jsonify(job.summary()), 202
+
+
+@app.route('/api/quantum/jobs', methods=['GET'])
+def list_jobs():
+    """Summaries of the jobs in the table, without results"""
+    return jsonify({'jobs': job_manager.list()})
+
+
+@app.route('/api/quantum/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a job: status, timings and the result once it succeeded"""
+    return jsonify(job_manager.get(job_id).summary())
+
+
+@app.route('/api/quantum/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued job or ask a running one to stop"""
+    return jsonify(job_manager.cancel(job_id).summary(include_result=False))
+
+
+@app.route('/api/quantum/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Follow a job as Server-Sent Events (status, progress, done), resumable with Last-Event-ID"""
+    job = job_manager.get(job_id)
+    since = int(request.headers.get('Last-Event-ID', request.args.get('since', 0)))
+    return Response(quantum_jobs.event_stream(job, since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/quantum/health', methods=['GET'])
+def health():
+    """Liveness check, the process is answering requests"""
+    return jsonify({'status': 'alive', 'pid': os.getpid()})
+
+
+@app.route('/api/quantum/ready', methods=['GET'])
+def readiness():
+    """Readiness check, 503 until the backend is warm and again once shutdown has begun"""
+    if not ready.is_set():
+        status = 'stopping' if stopping.is_set() else 'starting'
+        return jsonify({'status': status, 'pid': os.getpid()}), 503
+    return jsonify({'status': 'ready', 'pid': os.getpid()})
+
+
 @app.route('/api/quantum/status', methods=['GET'])
 def get_status():
     """Get quantum backend status"""
@@ -306,17 +1321,34 @@ def get_status():
         'status': 'online',
         'backend': str(quantum_backend.backend),
         'shots': quantum_backend.shots,
+        'aer_threads': quantum_backend.aer_threads,
+        'aer_runs': quantum_backend.max_runs,
+        'pid': os.getpid(),
+        'ready': ready.is_set(),
+        'modes': list(quantum_backend.MODES),
+        'engines': list(quantum_backend.ENGINES),
         'qiskit_version': '1.0+',
+        'circuit_cache': quantum_backend.cache.info(),
+        'exact_cache': quantum_backend.exact_cache.info(),
+        'circuit_drawings': quantum_backend.drawings.info(),
+        'job_queue': job_manager.info(),
         'available_algorithms': [
             'superposition',
             'grover',
             'vqe',
-            'phase_estimation'
-        ]
+            'phase_estimation',
+            'phase_estimation_sweep'
+        ],
+        'max_batch': quantum_backend.max_batch
     })
 
 
 if __name__ == '__main__':
+    # Development server, serve production traffic with: gunicorn -c gunicorn.conf.py wsgi:app
+    host = os.environ.get('QUANTUM_HOST', '127.0.0.1')
+    port = int(os.environ.get('QUANTUM_PORT', 5000))
+    debug = os.environ.get('QUANTUM_DEBUG', '0') == '1'
+    
     print("=" * 60)
     print("🔬 QUANTUM NAVIGATION BACKEND - QISKIT")
     print("=" * 60)
@@ -324,13 +1356,21 @@ if __name__ == '__main__':
     print(f"Shots: {quantum_backend.shots}")
     print("=" * 60)
     print("\n🚀 Starting Flask API server...")
-    print("📡 API will be available at: http://localhost:5000")
+    print(f"📡 API will be available at: http://{host}:{port}")
     print("\nAvailable endpoints:")
     print("  POST /api/quantum/superposition")
     print("  POST /api/quantum/grover")
     print("  POST /api/quantum/vqe")
     print("  POST /api/quantum/phase_estimation")
-    print("  GET  /api/quantum/status")
-    print("\n⚛️ Ready to run quantum algorithms!\n")
+    print("  POST /api/quantum/phase_estimation/sweep")
+    print("  POST /api/quantum/batch")
+    print("  GET  /api/quantum/circuit/<circuit_id>")
+    print("  POST /api/quantum/jobs  (GET/DELETE /api/quantum/jobs/<id>, GET .../events)")
+    print("  GET  /api/quantum/status, /api/quantum/health, /api/quantum/ready")
     
-    app.run(debug=True, port=5000)
+    warm_up()
+    print("\n⚛️ Ready to run quantum algorithms!\n")
+    try:
+        app.run(host=host, port=port, debug=debug, threaded=True)
+    finally:
+        shutdown()
@@ -0,0 +1,426 @@
+"""
+Asynchronous job queue for long quantum runs
+Submitted callables run on a bounded thread pool. Every job records its
+status, its result or error, and a stream of events that clients can poll
+or follow as Server-Sent Events. Cancellation and time limits are
+cooperative: a queued job never starts, a running job stops at its next
+progress()/check() call, and a step that cannot be interrupted (one Aer
+run) is discarded if the job was cancelled or ran out of time meanwhile.
+With a JobStore the jobs of several server processes share one table:
+each process runs its own jobs, every process can poll, follow and
+cancel all of them.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMED_OUT = 'timed_out'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED, TIMED_OUT)
+
+
+class JobNotFound(KeyError):
+    """No job with this id, or it has been pruned"""
+
+
+class QueueFull(RuntimeError):
+    """The job table is full of unfinished jobs"""
+
+
+class QueueClosed(RuntimeError):
+    """The manager has been shut down and takes no new jobs"""
+
+
+class JobStopped(Exception):
+    """Raised inside a job that was cancelled or ran past its time limit, args[0] is the status"""
+
+
+class Job:
+    """State, result and event log of one submitted callable"""
+
+    def __init__(self, kind, timeout, max_events=1000, store=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.timeout = timeout
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.deadline = None
+        self.result = None
+        self.error = None
+        self.events = deque(maxlen=max_events)
+        self.sequence = 0
+        self.cancel_requested = threading.Event()
+        self.condition = threading.Condition()
+        self.future = None
+        self.store = store
+
+    def check(self):
+        """Raise JobStopped if the job has been cancelled (here or through the store) or is out of time"""
+        if self.store is not None and not self.cancel_requested.is_set() and self.store.cancel_requested(self.id):
+            self.cancel_requested.set()
+        if self.cancel_requested.is_set():
+            raise JobStopped(CANCELLED)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise JobStopped(TIMED_OUT)
+
+    def progress(self, **data):
+        """Publish a progress event from inside the job, stopping it if requested"""
+        self.check()
+        self.publish('progress', data)
+
+    def publish(self, event, data):
+        with self.condition:
+            self.sequence += 1
+            self.events.append({'seq': self.sequence, 'event': event, 'time': time.time(), 'data': data})
+            if self.store is not None:
+                self.store.append(self.id, self.events[-1])
+            self.condition.notify_all()
+
+    def save(self):
+        """Write the current summary to the store, if there is one"""
+        if self.store is not None:
+            with self.condition:
+                self.store.save(self.summary())
+
+    def events_since(self, seq, timeout=None):
+        """Events after seq, waiting up to timeout for new ones while the job is unfinished"""
+        with self.condition:
+            if timeout and self.sequence <= seq and self.status not in FINISHED:
+                self.condition.wait(timeout)
+            return [event for event in self.events if event['seq'] > seq]
+
+    def summary(self, include_result=True):
+        summary = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'runtime': (self.finished or time.time()) - self.started if self.started else None,
+            'timeout': self.timeout,
+            'events': self.sequence,
+            'cancel_requested': self.cancel_requested.is_set(),
+            'error': self.error
+        }
+        if include_result:
+            summary['result'] = self.result
+        return summary
+
+
+class JobStore:
+    """Job summaries and event logs in a directory shared by the server processes
+
+    The process running a job rewrites <id>.json (its summary, result
+    included) on every status change and appends its events to
+    <id>.events, one JSON line each. Other processes read both, and ask
+    the owner to stop a job by creating <id>.cancel, which Job.check()
+    looks for. Files are replaced atomically, so readers never see a
+    partial summary.
+    """
+
+    JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, job_id, suffix):
+        if not self.JOB_ID.fullmatch(job_id):
+            raise JobNotFound(job_id)
+        return os.path.join(self.directory, job_id + suffix)
+
+    def save(self, summary):
+        summary = dict(summary, pid=os.getpid())
+        path = self.path(summary['job_id'], '.json')
+        partial = f'{path}.{os.getpid()}.{threading.get_ident()}'
+        with open(partial, 'w') as file:
+            json.dump(summary, file, default=to_json)
+        os.replace(partial, path)
+
+    def append(self, job_id, event):
+        with open(self.path(job_id, '.events'), 'a') as file:
+            file.write(json.dumps(event, default=to_json) + '\n')
+
+    def load(self, job_id):
+        """Stored summary of a job, JobNotFound if no process has saved it"""
+        try:
+            with open(self.path(job_id, '.json')) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            raise JobNotFound(job_id)
+
+    def events(self, job_id):
+        try:
+            with open(self.path(job_id, '.events')) as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return []
+        # The owner may be halfway through appending the last line
+        return [json.loads(line) for line in lines if line.endswith('\n')]
+
+    def request_cancel(self, job_id):
+        open(self.path(job_id, '.cancel'), 'a').close()
+
+    def cancel_requested(self, job_id):
+        return os.path.exists(self.path(job_id, '.cancel'))
+
+    def remove(self, job_id):
+        for suffix in ('.json', '.events', '.cancel'):
+            try:
+                os.remove(self.path(job_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def job_ids(self):
+        return [name[:-5] for name in os.listdir(self.directory)
+                if name.endswith('.json') and self.JOB_ID.fullmatch(name[:-5])]
+
+
+class StoredJob:
+    """Read-only view of a job run by another server process, reread from the JobStore on every access"""
+
+    def __init__(self, store, job_id, poll=0.25):
+        self.store = store
+        self.id = job_id
+        self.poll = poll
+        self.summary()
+
+    def summary(self, include_result=True):
+        summary = self.store.load(self.id)
+        pid = summary.pop('pid')
+        if summary['status'] not in FINISHED and not process_alive(pid):
+            # The owner died without finishing (e.g. a killed worker), nobody will update the job again
+            summary.update(status=FAILED, error='the server process running the job exited')
+        elif summary['status'] not in FINISHED and summary['started']:
+            summary['runtime'] = time.time() - summary['started']
+        summary['events'] = self.sequence
+        summary['cancel_requested'] = summary['cancel_requested'] or self.store.cancel_requested(self.id)
+        if not include_result:
+            summary.pop('result')
+        return summary
+
+    @property
+    def status(self):
+        return self.summary(include_result=False)['status']
+
+    @property
+    def sequence(self):
+        events = self.store.events(self.id)
+        return events[-1]['seq'] if events else 0
+
+    def events_since(self, seq, timeout=None):
+        """Events after seq, polling the store up to timeout for new ones while the job is unfinished"""
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            events = [event for event in self.store.events(self.id) if event['seq'] > seq]
+            if events or self.status in FINISHED or time.monotonic() >= deadline:
+                return events
+            time.sleep(self.poll)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobManager:
+    """Bounded thread pool plus a table of recent jobs
+
+    max_workers is the concurrency limit, max_jobs bounds the table:
+    finished jobs are pruned oldest first (or after `retention` seconds)
+    and submissions fail with QueueFull when only unfinished jobs remain.
+    Every job has a time limit, default_timeout unless the submitter asks
+    for another one, capped at max_timeout. With a store (JobStore) the
+    jobs of other processes sharing it can be looked up, listed and
+    cancelled too; the limits apply to this process's own jobs.
+    """
+
+    def __init__(self, max_workers=2, max_jobs=1000, default_timeout=300.0, retention=3600.0, max_timeout=3600.0,
+                 store=None):
+        if not 0 < default_timeout <= max_timeout:
+            raise ValueError(f"default_timeout must be in (0, {max_timeout}], got {default_timeout}")
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        self.retention = retention
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = None
+        self.closed = False
+        self.store = store
+
+    def submit(self, function, kind='job', timeout=None):
+        """Queue function(job) and return the Job, the return value becomes job.result"""
+        timeout = self.time_limit(timeout)
+        with self.lock:
+            if self.closed:
+                raise QueueClosed("the job queue is shutting down")
+            self.prune()
+            if len(self.jobs) >= self.max_jobs:
+                raise QueueFull(f"{len(self.jobs)} unfinished jobs, try again later")
+            job = Job(kind, timeout, store=self.store)
+            job.save()
+            self.jobs[job.id] = job
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='quantum-job')
+            job.future = self.executor.submit(self.run, job, function)
+        return job
+
+    def time_limit(self, timeout):
+        """Seconds a job may run: default_timeout for None, a positive number capped at max_timeout"""
+        if timeout is None:
+            return self.default_timeout
+        if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not timeout > 0:
+            raise ValueError(f"timeout must be a positive number of seconds, got {timeout!r}")
+        return min(float(timeout), self.max_timeout)
+
+    def run(self, job, function):
+        with job.condition:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.started = time.time()
+            job.deadline = time.monotonic() + job.timeout
+            job.publish('status', {'status': RUNNING})
+            job.save()
+        try:
+            job.check()
+            result = function(job)
+            job.check()
+        except JobStopped as stop:
+            self.finish(job, stop.args[0], error=('cancelled' if stop.args[0] == CANCELLED
+                                                  else f'exceeded time limit of {job.timeout} s'))
+        except Exception as error:
+            self.finish(job, FAILED, error=f'{type(error).__name__}: {error}')
+        else:
+            self.finish(job, SUCCEEDED, result=result)
+
+    def finish(self, job, status, result=None, error=None):
+        with job.condition:
+            if job.status in FINISHED:
+                return
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished = time.time()
+            job.publish('done', job.summary())
+            job.save()
+
+    def get(self, job_id):
+        """A Job of this process or a StoredJob of another one"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        if self.store is None:
+            raise JobNotFound(job_id)
+        return StoredJob(self.store, job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued job at once, ask a running one (or the process running it) to stop"""
+        job = self.get(job_id)
+        if isinstance(job, StoredJob):
+            if job.status not in FINISHED:
+                self.store.request_cancel(job_id)
+            return job
+        job.cancel_requested.set()
+        with job.condition:
+            if job.status == QUEUED:
+                job.future.cancel()
+                self.finish(job, CANCELLED, error='cancelled')
+            job.save()
+        return job
+
+    def prune(self):
+        """Drop expired finished jobs, then the oldest finished ones while the table is full"""
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.status in FINISHED and now - job.finished > self.retention:
+                self.forget(job_id)
+        for job_id, job in list(self.jobs.items()):
+            if len(self.jobs) < self.max_jobs:
+                break
+            if job.status in FINISHED:
+                self.forget(job_id)
+
+    def forget(self, job_id):
+        del self.jobs[job_id]
+        if self.store is not None:
+            self.store.remove(job_id)
+
+    def list(self):
+        """Summaries without results, of this process's jobs and of the others' in the store"""
+        with self.lock:
+            summaries = [job.summary(include_result=False) for job in self.jobs.values()]
+            local = set(self.jobs)
+        if self.store is not None:
+            for job_id in self.store.job_ids():
+                if job_id not in local:
+                    try:
+                        summaries.append(StoredJob(self.store, job_id).summary(include_result=False))
+                    except JobNotFound:
+                        # Pruned by its owner meanwhile
+                        pass
+            summaries.sort(key=lambda summary: summary['created'])
+        return summaries
+
+    def info(self):
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {'max_workers': self.max_workers, 'max_jobs': self.max_jobs, 'default_timeout': self.default_timeout,
+                'max_timeout': self.max_timeout, 'closed': self.closed, 'jobs': counts,
+                'store': self.store.directory if self.store is not None else None}
+
+    def shutdown(self, wait=True, cancel=True):
+        """Stop accepting work, optionally cancel everything still pending or running"""
+        with self.lock:
+            self.closed = True
+        if cancel:
+            with self.lock:
+                pending = [job.id for job in self.jobs.values() if job.status not in FINISHED]
+            for job_id in pending:
+                self.cancel(job_id)
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=cancel)
+
+
+def to_json(value):
+    """json.dumps fallback for numpy scalars and anything else in a result"""
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def event_stream(job, since=0, keepalive=15.0):
+    """Server-Sent Events for a job, one message per event, ending after the final 'done' event"""
+    while True:
+        events = job.events_since(since, keepalive)
+        for event in events:
+            since = event['seq']
+            yield f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=to_json)}\n\n"
+        # 'done' is published together with the final status, so it has been sent by now
+        if job.status in FINISHED and job.sequence <= since:
+            return
+        if not events:
+            yield ': keepalive\n\n'
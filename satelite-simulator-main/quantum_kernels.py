@@ -0,0 +1,89 @@
+"""
+Native NumPy kernels for quantum workloads with a closed-form action
+Grover search only needs its final distribution. Starting from the uniform
+superposition the oracle is a sign flip on the marked amplitudes and the
+diffusion operator a reflection about the mean, a -> 2*mean - a, so the
+state vector never has to go through a gate-by-gate simulation of the
+X/H/multi-controlled-phase circuit. Phase estimation of a known eigenphase
+has a closed-form outcome distribution, so a whole sweep of phases is one
+array expression. Index k of every array here is the basis state k, i.e.
+the bitstring format(k, f'0{n}b').
+"""
+
+import numpy as np
+
+
+def grover_iterations(num_qubits, num_marked):
+    """Optimal number of Grover iterations for M marked states, floor(π/4 · √(N/M))"""
+    return int(np.floor(np.pi / 4 * np.sqrt(2**num_qubits / num_marked)))
+
+
+def grover_state(num_qubits, target_states, iterations):
+    """Real amplitudes after `iterations` Grover iterations on num_qubits qubits
+
+    The vector is kept as sign*base + offset. A reflection about the mean
+    only updates sign and offset (the mean itself comes from a running sum),
+    and the oracle rewrites the marked entries of base, so an iteration
+    costs O(#marked) and the whole vector is touched once at the end.
+    """
+    size = 2**num_qubits
+    base = np.full(size, 2.0**(-num_qubits/2))
+    marked = np.unique(np.asarray(target_states, dtype=np.int64))
+    sign, offset = 1.0, 0.0
+    total = base.sum()
+    for _ in range(iterations):
+        # Oracle: phase flip of the marked states
+        value = sign*base[marked] + offset
+        total -= 2.0*value.sum()
+        base[marked] = sign*(-value - offset)
+        # Diffusion: 2|s><s| - I, which leaves the sum unchanged
+        sign, offset = -sign, 2.0*total/size - offset
+    return sign*base + offset
+
+
+def grover_probabilities(num_qubits, target_states, iterations):
+    """Measurement distribution after Grover search, the squared amplitudes"""
+    return np.square(grover_state(num_qubits, target_states, iterations))
+
+
+def phase_estimation_probabilities(phases, counting_qubits):
+    """Exact QPE outcome distributions, one row per phase
+
+    For an eigenphase phase (radians) and N = 2^counting_qubits the inverse
+    QFT leaves outcome y with probability |sin(pi*N*d) / (N*sin(pi*d))|^2,
+    d = phase/2pi - y/N, written with sinc so that d = 0 needs no special
+    case. Returns a (len(phases), N) array.
+    """
+    size = 2**counting_qubits
+    turns = np.asarray(phases, dtype=float).reshape(-1)/(2*np.pi)
+    delta = turns[:, np.newaxis] - np.arange(size)/size
+    delta -= np.round(delta)
+    return np.square(np.sinc(size*delta)/np.sinc(delta))
+
+
+def bitstrings(indices, num_bits):
+    """Basis state indices as qiskit-style bitstrings, most significant bit first"""
+    return [format(index, f'0{num_bits}b') for index in np.asarray(indices).tolist()]
+
+
+def probability_dict(probabilities, num_bits):
+    """{bitstring: probability} for every state with non-zero probability"""
+    probabilities = np.asarray(probabilities, dtype=float)
+    states = np.flatnonzero(probabilities)
+    return dict(zip(bitstrings(states, num_bits), probabilities[states].tolist()))
+
+
+def sample_frequencies(probabilities, shots, num_bits, rng=None):
+    """Measured frequencies {bitstring: count/shots} of `shots` draws from the distribution"""
+    rng = np.random.default_rng() if rng is None else rng
+    probabilities = np.asarray(probabilities, dtype=float)
+    counts = rng.multinomial(shots, probabilities/probabilities.sum())
+    states = np.flatnonzero(counts)
+    return dict(zip(bitstrings(states, num_bits), (counts[states]/shots).tolist()))
+
+
+def sample_matrix(probabilities, shots, rng=None):
+    """Measured frequencies of `shots` draws from every row of a probability matrix"""
+    rng = np.random.default_rng() if rng is None else rng
+    probabilities = np.asarray(probabilities, dtype=float)
+    return rng.multinomial(shots, probabilities/probabilities.sum(axis=1, keepdims=True))/shots
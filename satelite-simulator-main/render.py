@@ -0,0 +1,79 @@
+"""
+Headless parallel frame renderer for orbit animations
+Positions for every frame are computed up front (JPL.Ephemeris), then
+contiguous frame ranges are drawn by worker processes on the Agg backend.
+Each worker builds its figure once and updates persistent line artists in
+place, so a frame costs one draw no matter how long the traces get.
+"""
+
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def render_range(positions, names, colors, orbits, out_dir, first, last, limits, dpi=100):
+    """Draw frames first..last-1 into out_dir/NNNN.png, positions are (frames, bodies, 3) in AU"""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(10, 8))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    ax.set_xlabel('X (AU)', fontsize=12)
+    ax.set_ylabel('Y (AU)', fontsize=12)
+    ax.grid(True)
+    ax.set_aspect('equal', adjustable='box')
+    ax.set_xlim(limits[0])
+    ax.set_ylim(limits[1])
+    traces = []
+    markers = []
+    for i in range(0, len(names)):
+        if orbits is not None:
+            ax.plot(orbits[i][0], orbits[i][1], color=colors[i])
+        traces.append(ax.plot([], [], color=colors[i], label=names[i])[0])
+        markers.append(ax.plot([], [], marker='o', color=colors[i])[0])
+    ax.legend(loc='upper right')
+    title = ax.set_title('', fontsize=12)
+
+    for j in range(first, last):
+        title.set_text('Skip = ' + str(j))
+        for i in range(0, len(names)):
+            ##Traces start at frame 1 like AnimateOrbits
+            traces[i].set_data(positions[1:j+1, i, 0], positions[1:j+1, i, 1])
+            markers[i].set_data([positions[j, i, 0]], [positions[j, i, 1]])
+        fig.savefig(os.path.join(out_dir, '%04d.png' % j), dpi=dpi)
+    return last - first
+
+
+def render_frames(positions, names, colors, orbits=None, out_dir='Frames', workers=None, dpi=100):
+    """Render every frame of positions (frames, bodies, 3) in AU over a process pool"""
+    os.makedirs(out_dir, exist_ok=True)
+    num_frames = len(positions)
+    workers = workers or os.cpu_count()
+    extent = np.max(np.abs(positions[:, :, 0:2])) if num_frames > 0 else 1.0
+    if orbits is not None:
+        extent = max(extent, max(np.max(np.abs(orbit)) for orbit in orbits))
+    extent *= 1.05
+    limits = ([-extent, extent], [-extent, extent])
+
+    ##A few ranges per worker keeps the pool balanced while each range reuses its figure
+    bounds = np.linspace(0, num_frames, min(num_frames, 4*workers) + 1).astype(int)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_range, positions, names, colors, orbits, out_dir, first, last, limits, dpi)
+                   for first, last in zip(bounds[:-1], bounds[1:]) if last > first]
+        rendered = sum(future.result() for future in futures)
+    return rendered
+
+
+def encode_movie(frame_dir, movie, fps=30):
+    """Encode the numbered frames of frame_dir into one video file with ffmpeg"""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError('ffmpeg is required to encode ' + str(movie))
+    subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(fps),
+                    '-i', os.path.join(frame_dir, '%04d.png'),
+                    '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', movie], check=True)
+    return movie
@@ -1,12 +1,14 @@
 import numpy as np
 import copy as C
-import matplotlib.pyplot as plt
-import plotting as P
 import mio as fileIO 
+import octree
+import conjunction
 import sys
+from collections import OrderedDict
 
 class JPL():
-    def __init__(self,julian_day):
+    def __init__(self,julian_day,cache_size=4096):
+        self.ephemeris_cache = EphemerisCache(cache_size)
         self.planetsInit()
         print('Planets Initialized')
         satellites = self.computePlanetLocations(julian_day)
@@ -14,6 +16,8 @@ class JPL():
         self.MilkyWay = SolarSystem(satellites,'The Solar System')
 
     def AnimateOrbits(self,pp,julian_day,day_skip,num_skips,pause_time):
+        import matplotlib.pyplot as plt
+        import plotting as P
         framenumber = 0
         print('Animating Orbits')
         plt.close("all")
@@ -21,16 +25,19 @@ class JPL():
         plti = P.plottool(12,'X (AU)','Y (AU)','Skip = '+str(0))
         XTRACES = []
         YTRACES = []
+        ##Every frame's planet positions come from one batched ephemeris call
+        julian_days = julian_day + day_skip*np.arange(0,num_skips)
+        bodies = [satellite.name for satellite in self.MilkyWay.satellites]
+        positions = self.Ephemeris(julian_days,bodies)/self.MilkyWay.AU
         for j in range(0,num_skips):
             print('j=',j)
-            self.MilkyWay.satellites = self.computePlanetLocations(julian_day+j*day_skip)
             plt.cla()
             plt.title('Skip = '+str(j))         
             for i in range(0,self.MilkyWay.numsatellites):
-                offsetx = self.MilkyWay.satellites[3].x0/self.MilkyWay.AU*0
-                offsety = self.MilkyWay.satellites[3].y0/self.MilkyWay.AU*0
-                x = self.MilkyWay.satellites[i].x0/self.MilkyWay.AU-offsetx
-                y = self.MilkyWay.satellites[i].y0/self.MilkyWay.AU-offsety
+                offsetx = positions[j,3,0]*0
+                offsety = positions[j,3,1]*0
+                x = positions[j,i,0]-offsetx
+                y = positions[j,i,1]-offsety
                 if j == 0:
                     print('J == 0')
                     tracex = []
@@ -46,7 +53,7 @@ class JPL():
             plt.legend(loc='upper right')
             plt.grid()
             plt.axis('equal')
-            if self.numsatellites < 7:
+            if self.MilkyWay.numsatellites < 7:
                 plt.axis('square')
                 plt.xlim([-4,4])
                 plt.ylim([-4,4])
@@ -60,64 +67,50 @@ class JPL():
             print(filename)
             plt.savefig(filename)
 
+    def RenderAnimation(self,julian_day,day_skip,num_skips,out_dir='Frames',workers=None,movie=None,fps=30):
+        ##Headless version of AnimateOrbits: one batched ephemeris call, frames drawn
+        ##in parallel on the Agg backend, optionally encoded into a single movie file
+        import render
+        print('Rendering Orbits')
+        julian_days = julian_day + day_skip*np.arange(0,num_skips)
+        bodies = [satellite.name for satellite in self.MilkyWay.satellites]
+        positions = self.Ephemeris(julian_days,bodies)/self.MilkyWay.AU
+        try:
+            orbits = [(satellite.x/self.MilkyWay.AU,satellite.y/self.MilkyWay.AU) for satellite in self.MilkyWay.satellites]
+        except AttributeError:
+            orbits = None ##Orbit() has not been called
+        colors = [satellite.color for satellite in self.MilkyWay.satellites]
+        frames = render.render_frames(positions,bodies,colors,orbits,out_dir,workers)
+        print('Rendered',frames,'frames into',out_dir)
+        if movie is not None:
+            render.encode_movie(out_dir,movie,fps)
+            print('Encoded',movie)
+        return frames
+
     def planetsInit(self):
         self.G = 6.67408e-11 #m3 kg-1 s-2
 
         self.correction_parameters = fileIO.dlmread('Outer_Planets_Corrections.txt',' ')
 
-        file = open('Solar_System_Orbital_Elements.txt')
-        ctr = 0
         self.names = ['Sun','Mercury','Venus','Earth','Mars','Jupiter','Saturn','Uranus','Neptune','Pluto']
         self.colorwheel = ['tan','orange','blue','red','orange','yellow','green','blue','grey']
         self.AU = 149597870700.0
-        self.a0 = []
-        self.e0 = []
-        self.i0 = []
-        self.L0 = []
-        self.wbar0 = []
-        self.OMEGA0 = []
-        self.adot = []
-        self.edot = []
-        self.idot = []
-        self.Ldot = []
-        self.wbardot = []
-        self.OMEGAdot = []
-        planet_number = 1  # Start from Mercury (index 1, Sun is 0)
-        for line in file:
-            if len(line) > 0:
-                numbers = line.split(',')
-          
-                if ctr == 0:
-                    print(self.names[planet_number])
-                    a0 = float(numbers[0])
-                    self.a0.append(a0)
-                    e0 = float(numbers[1])
-                    self.e0.append(e0)
-                    i0 = float(numbers[2])
-                    self.i0.append(i0)
-                    L0 = float(numbers[3])
-                    self.L0.append(L0)
-                    wbar0 = float(numbers[4])
-                    self.wbar0.append(wbar0)
-                    OMEGA0 = float(numbers[5])
-                    self.OMEGA0.append(OMEGA0)
-                if ctr == 1:
-                    adot = float(numbers[0])
-                    self.adot.append(adot)
-                    edot = float(numbers[1])
-                    self.edot.append(edot)
-                    idot = float(numbers[2])
-                    self.idot.append(idot)
-                    Ldot = float(numbers[3])
-                    self.Ldot.append(Ldot)
-                    wbardot = float(numbers[4])
-                    self.wbardot.append(wbardot)
-                    OMEGAdot = float(numbers[5])                    
-                    self.OMEGAdot.append(OMEGAdot)
-                ctr+=1
-                if ctr == 2:
-                    ctr = 0
-                    planet_number += 1
+        ##One structured array with a row per body, cached in binary next to the text file
+        self.elements = fileIO.load_elements('Solar_System_Orbital_Elements.txt')
+        for planet_number in range(1,min(len(self.elements),len(self.names)-1)+1):
+            print(self.names[planet_number])
+        self.a0 = self.elements['a0']
+        self.e0 = self.elements['e0']
+        self.i0 = self.elements['i0']
+        self.L0 = self.elements['L0']
+        self.wbar0 = self.elements['wbar0']
+        self.OMEGA0 = self.elements['OMEGA0']
+        self.adot = self.elements['adot']
+        self.edot = self.elements['edot']
+        self.idot = self.elements['idot']
+        self.Ldot = self.elements['Ldot']
+        self.wbardot = self.elements['wbardot']
+        self.OMEGAdot = self.elements['OMEGAdot']
 
     def computePlanetLocations(self,julian_day):
       
@@ -128,6 +121,15 @@ class JPL():
             name = self.names[planet_number]
            
             this_planet = Satellite(0,432169*5280./3.28,np.asarray([0,0,0]),np.asarray([0,0,0]),name,self.colorwheel[planet_number-1],0)
+
+            ##Repeated epochs skip Kepler's equation entirely
+            key = (name,float(julian_day))
+            state = self.ephemeris_cache.Get(key)
+            if state is not None:
+                self.ephemeris_cache.Apply(this_planet,state)
+                satellites.append(this_planet)
+                planet_number += 1
+                continue
         
             T = (julian_day - 2451545.)/36525.0
             this_planet.a = (self.a0[i] + T*self.adot[i])*self.AU
@@ -150,6 +152,7 @@ class JPL():
                 f = 0
        
             self.ComputeCoordinates(this_planet,T,b,c,s,f)
+            self.ephemeris_cache.Put(key,self.ephemeris_cache.Capture(this_planet))
             satellites.append(this_planet)
             planet_number += 1
         return satellites
@@ -194,6 +197,119 @@ class JPL():
 
         T = planet.a**(3./2.)*2*np.pi/(np.sqrt(self.G*self.Sun.M))
 
+    def Ephemeris(self,julian_days,bodies=None,max_iterations=50,tolerance=1e-6):
+        ##Heliocentric positions (m) of many bodies at many epochs in one pass.
+        ##julian_days is an array of epochs, bodies a list of names or planet
+        ##numbers (0 = Sun). Returns an (epochs,bodies,3) array.
+        julian_days = np.atleast_1d(np.asarray(julian_days,dtype=float))
+        if bodies is None:
+            bodies = self.names[0:len(self.names)-1]
+        planet_numbers = np.asarray([self.names.index(body) if isinstance(body,str) else int(body) for body in bodies])
+        if np.any(planet_numbers < 0) or np.any(planet_numbers > len(self.a0)):
+            raise ValueError('Ephemeris bodies must be the Sun or one of the '+str(len(self.a0))+' planets')
+
+        ##Elements indexed by planet number, the Sun gets zeros (a = 0 keeps it at the origin)
+        elements = np.zeros((12,len(self.a0)+1))
+        elements[:,1:] = [self.a0,self.adot,self.e0,self.edot,self.i0,self.idot,
+                         self.L0,self.Ldot,self.wbar0,self.wbardot,self.OMEGA0,self.OMEGAdot]
+        corrections = np.zeros((len(self.a0)+1,4))
+        num_corrections = min(len(self.correction_parameters),len(self.a0)-4)
+        if num_corrections > 0:
+            corrections[5:5+num_corrections] = self.correction_parameters[0:num_corrections]
+        elements = elements[:,planet_numbers]
+        b,c,s,f = corrections[planet_numbers].T
+
+        T = ((julian_days - 2451545.)/36525.0)[:,np.newaxis]
+        a = (elements[0] + T*elements[1])*self.AU
+        e = elements[2] + T*elements[3]
+        I = (elements[4] + T*elements[5])*np.pi/180.0
+        L = elements[6] + T*elements[7]
+        wbar = elements[8] + T*elements[9]
+        OMEGA = elements[10] + T*elements[11]
+        w = (wbar - OMEGA)*np.pi/180.0
+        OMEGA = OMEGA*np.pi/180.0
+
+        M = L - wbar + b*T**2 + c*np.cos(f*T) + s*np.sin(f*T)
+        M = (M + 180.0) % 360.0 - 180.0
+        E = self.SolveKepler(M,e,max_iterations,tolerance)
+
+        xprime = a*(np.cos(E*np.pi/180.0)-e)
+        yprime = a*np.sqrt(1-e**2)*np.sin(E*np.pi/180.0)
+        positions = np.empty(xprime.shape+(3,))
+        positions[:,:,0] = (np.cos(w)*np.cos(OMEGA) - np.sin(w)*np.sin(OMEGA)*np.cos(I))*xprime + (-np.sin(w)*np.cos(OMEGA)-np.cos(w)*np.sin(OMEGA)*np.cos(I))*yprime
+        positions[:,:,1] = (np.cos(w)*np.sin(OMEGA)+np.sin(w)*np.cos(OMEGA)*np.cos(I))*xprime + (-np.sin(w)*np.sin(OMEGA)+np.cos(w)*np.cos(OMEGA)*np.cos(I))*yprime
+        positions[:,:,2] = (np.sin(w)*np.sin(I))*xprime + (np.cos(w)*np.sin(I))*yprime
+        return positions
+
+    def InitialStates(self,julian_day,bodies=None,dt_days=0.5):
+        ##Heliocentric positions (m) and central-difference velocities (m/s) at
+        ##one epoch, for starting a Simulate run from the ephemeris
+        positions = self.Ephemeris([julian_day-dt_days,julian_day,julian_day+dt_days],bodies)
+        velocities = (positions[2] - positions[0])/(2.0*dt_days*86400.0)
+        return positions[1],velocities
+
+    def SolveKepler(self,M,e,max_iterations=50,tolerance=1e-6):
+        ##Vectorized Newton iteration on Kepler's equation (angles in degrees),
+        ##same update as ComputeCoordinates but with a per-element convergence mask
+        estar = e*180./np.pi
+        E = M + estar*np.sin(M*np.pi/180.0)
+        active = np.ones(np.shape(E),dtype=bool)
+        for iteration in range(0,max_iterations):
+            dM = M - (E - estar*np.sin(E*np.pi/180.0))
+            dE = dM/(1.0-e*np.cos(E*np.pi/180.0))
+            E = np.where(active,E+dE,E)
+            active &= np.abs(dM) > tolerance
+            if not active.any():
+                break
+        return E
+
+class EphemerisCache():
+    ##Bounded LRU memo of the heliocentric state computed by
+    ##JPL.computePlanetLocations, keyed on (body name, julian day)
+    fields = ('a','initial_enorm','initial_i','initial_L','wbar','initial_OMEGA',
+              'initial_enormstar','initial_w','initial_M','initial_semilatus',
+              'x0','y0','z0')
+
+    def __init__(self,maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def Get(self,key):
+        state = self.entries.get(key)
+        if state is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return state
+
+    def Put(self,key,state):
+        if self.maxsize is not None and self.maxsize <= 0:
+            return
+        self.entries[key] = state
+        self.entries.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def Capture(self,planet):
+        return tuple(getattr(planet,field) for field in self.fields)
+
+    def Apply(self,planet,state):
+        for field,value in zip(self.fields,state):
+            setattr(planet,field,value)
+        planet.initial_pos = np.asarray([planet.x0,planet.y0,planet.z0])
+
+    def Clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def Info(self):
+        return {'hits':self.hits,'misses':self.misses,'size':len(self.entries),'maxsize':self.maxsize}
+
 class UniverseParameters():
     def __init__(self):
         print('Creating Standard Celestial Bodies')
@@ -203,11 +319,67 @@ class UniverseParameters():
         self.G = 6.67408e-11 #m3 kg-1 s-2
         print('Universe Set')
 
+def OrbitTracks(a,e,I,OMEGA,w,points):
+    ##(N,K,3) orbit ellipses for N bodies from stacked rotation matrices (angles in
+    ##radians). Body n is sampled at points[n] values of nu over [0,2pi]; shorter
+    ##tracks repeat their closing point up to K = max(points). Also returns nu (N,K)
+    a = np.asarray(a,dtype=float)
+    e = np.asarray(e,dtype=float)
+    I = np.asarray(I,dtype=float)
+    OMEGA = np.asarray(OMEGA,dtype=float)
+    w = np.asarray(w,dtype=float)
+    points = np.broadcast_to(np.asarray(points,dtype=int),a.shape)
+    K = int(points.max()) if points.size > 0 else 0
+    last = np.maximum(points - 1,1)[:,np.newaxis]
+    nu = 2*np.pi*np.minimum(np.arange(K)[np.newaxis,:],last)/last
+
+    rotation = np.empty(a.shape+(3,2))
+    rotation[:,0,0] = np.cos(w)*np.cos(OMEGA) - np.sin(w)*np.sin(OMEGA)*np.cos(I)
+    rotation[:,0,1] = -np.sin(w)*np.cos(OMEGA) - np.cos(w)*np.sin(OMEGA)*np.cos(I)
+    rotation[:,1,0] = np.cos(w)*np.sin(OMEGA) + np.sin(w)*np.cos(OMEGA)*np.cos(I)
+    rotation[:,1,1] = -np.sin(w)*np.sin(OMEGA) + np.cos(w)*np.cos(OMEGA)*np.cos(I)
+    rotation[:,2,0] = np.sin(w)*np.sin(I)
+    rotation[:,2,1] = np.cos(w)*np.sin(I)
+    plane = np.stack((a[:,np.newaxis]*(np.cos(nu)-e[:,np.newaxis]),
+                      a[:,np.newaxis]*np.sqrt(1-e[:,np.newaxis]**2)*np.sin(nu)),axis=-1)
+    return np.einsum('nij,nkj->nki',rotation,plane),nu
+
+class StateView():
+    ##Descriptor exposing one (3,) row of the shared state buffer. Reads return a
+    ##view, assignments copy the values into the buffer in place
+    def __init__(self,row):
+        self.row = row
+
+    def __get__(self,satellite,owner):
+        if satellite is None:
+            return self
+        return satellite.state[self.row,satellite.index]
+
+    def __set__(self,satellite,value):
+        satellite.state[self.row,satellite.index] = value
+
 class Satellite():
+    ##Rows of the (rows,N,3) state buffer. A lone satellite owns a one-body
+    ##buffer, SolarSystem rebinds every member to a single system-level buffer
+    state_rows = ('current_pos','current_vel','current_accel','nominal_pos','nominal_vel',
+                  'k1pos','k1vel','k2pos','k2vel','k3pos','k3vel','k4pos','k4vel')
+
+    __slots__ = ('M','r','mu','name','color','toCenter',
+                 'initial_pos','x0','y0','z0','initial_vel',
+                 'state','index',
+                 ##Orbital elements from JPL.computePlanetLocations
+                 'a','initial_enorm','initial_i','initial_L','wbar','initial_OMEGA',
+                 'initial_enormstar','initial_w','initial_M','initial_semilatus',
+                 ##Orbit() outputs
+                 'rorbit','xecl','yecl','zecl','x','y','z',
+                 ##Computed Quantities
+                 'xyz','xyzdot','h','hnorm','vnorm','rnorm','phi')
+
+    G = 6.67408e-11
+
     def __init__(self,M,r,pos,vel,name,color,toCenter):
         self.M = M
         self.r = r 
-        self.G = 6.67408e-11 
         self.mu = self.G*self.M
         self.name = name
         self.color = color
@@ -219,25 +391,15 @@ class Satellite():
         self.z0 = pos[2]
         self.initial_vel = vel
 
-        self.tracex = []
-        self.tracey = []
-        
+        self.state = np.zeros((len(self.state_rows),1,3))
+        self.index = 0
+
         self.nominal_pos = pos #Used for rk4 step
         self.nominal_vel = vel
 
         self.current_pos = pos #Used for rk4 step
         self.current_vel = vel
-        self.current_accel = np.asarray([0.,0.,0.]) ##Can't compute this until we know what other celestial bodies are in the universe
-
-        self.k1pos = []
-        self.k1vel = []
-        self.k2pos = []
-        self.k2vel = []
-        self.k3pos = []
-        self.k3vel = []
-        self.k4pos = []
-        self.k4vel = []
-
+        ##current_accel starts at zero, can't compute it until we know what other celestial bodies are in the universe
 
         ##Computed Quantities
         self.xyz = []
@@ -248,7 +410,6 @@ class Satellite():
         self.rnorm = []
         self.phi = []
 
-
     def Gravity(self,r):
         ##Assume that r is a vector in IJK frame
         rnorm = np.linalg.norm(r)
@@ -259,6 +420,12 @@ class Satellite():
         #in order to get force you need to multiply my mass of the satellite
         return accel
     
+    def Bind(self,state,index):
+        ##Move this satellite's state into row `index` of a shared buffer
+        state[:,index] = self.state[:,self.index]
+        self.state = state
+        self.index = index
+
     def CircularVelocity(self,altitude):
         vel_circ = np.sqrt(self.mu/(self.r+altitude))
         print('Computing Orbit around ',self.name)
@@ -271,6 +438,7 @@ class Satellite():
         print('Orbital Period (sec) = ',period,'at an altitude of (m)',altitude)
 
     def plotgravity(self,pp):
+        import plotting as P
         r = np.linspace(self.r/2.0,3*self.r,100)
         a = []
         for ri in r:
@@ -282,6 +450,66 @@ class Satellite():
         plti.plot(r/self.r,a)
         pp.savefig()
         
+for row,row_name in enumerate(Satellite.state_rows):
+    setattr(Satellite,row_name,StateView(row))
+
+class TrajectoryRecorder():
+    ##Preallocated history of every body's state. The number of samples is known
+    ##from tfinal, timestep and tnext before the run, so Record() writes in place
+    def __init__(self,numsatellites,tfinal,timestep,tnext):
+        steps = int(np.floor(tfinal/timestep)) + 2
+        if tnext > 0:
+            capacity = min(steps,int(np.floor(tfinal/tnext)) + 2)
+        else:
+            capacity = steps
+        capacity = max(capacity,1)
+        self.time = np.empty(capacity)
+        self.xyz = np.empty((capacity,numsatellites,3))
+        self.xyzdot = np.empty((capacity,numsatellites,3))
+        self.count = 0
+
+    def Record(self,t,pos,vel):
+        if self.count == len(self.time):
+            ##Only reachable through floating point drift in t or adaptive steps
+            ##recorded one by one, grow geometrically
+            self.time = np.concatenate((self.time,np.empty_like(self.time)))
+            self.xyz = np.concatenate((self.xyz,np.empty_like(self.xyz)))
+            self.xyzdot = np.concatenate((self.xyzdot,np.empty_like(self.xyzdot)))
+        self.time[self.count] = t
+        self.xyz[self.count] = pos
+        self.xyzdot[self.count] = vel
+        self.count += 1
+
+    def Finalize(self):
+        return self.time[:self.count],self.xyz[:self.count],self.xyzdot[:self.count]
+
+class TrajectoryWindow():
+    ##Recorder stand-in for histories that already exist, e.g. a window of a store
+    def __init__(self,window):
+        self.window = window
+
+    def Finalize(self):
+        return self.window
+
+class DormandPrince():
+    ##Butcher tableau, error weights and dense output polynomial of the
+    ##Dormand-Prince 5(4) pair
+    A = np.array([[0.,0.,0.,0.,0.],
+                  [1./5.,0.,0.,0.,0.],
+                  [3./40.,9./40.,0.,0.,0.],
+                  [44./45.,-56./15.,32./9.,0.,0.],
+                  [19372./6561.,-25360./2187.,64448./6561.,-212./729.,0.],
+                  [9017./3168.,-355./33.,46732./5247.,49./176.,-5103./18656.]])
+    B = np.array([35./384.,0.,500./1113.,125./192.,-2187./6784.,11./84.])
+    E = np.array([-71./57600.,0.,71./16695.,-71./1920.,17253./339200.,-22./525.,1./40.])
+    P = np.array([[1.,-8048581381./2820520608.,8663915743./2820520608.,-12715105075./11282082432.],
+                  [0.,0.,0.,0.],
+                  [0.,131558114200./32700410799.,-68118460800./10900136933.,87487479700./32700410799.],
+                  [0.,-1754552775./470086768.,14199869525./1410260304.,-10690763975./1880347072.],
+                  [0.,127303824393./49829197408.,-318862633887./49829197408.,701980252875./199316789632.],
+                  [0.,-282668133./205662961.,2019193451./616988883.,-1453857185./822651844.],
+                  [0.,40617522./29380423.,-110615467./29380423.,69997945./29380423.]])
+
 class SolarSystem():
     def __init__(self,satellites,name):
         self.AU = 149597870700.0
@@ -293,9 +521,24 @@ class SolarSystem():
         print('Satellite Names:')
         for i in range(0,self.numsatellites):
             print(self.satellites[i].name)
+        self.gravity = 'direct'
+        self.theta = 0.5
+        self.leaf_size = 8
+        self.BindSatellites()
 
         # self.ComputeOrbitalElements()  # Method not implemented
 
+    def BindSatellites(self):
+        ##Every satellite's state becomes a view into one shared (rows,N,3) buffer
+        self.numsatellites = len(self.satellites)
+        self.state = np.zeros((len(Satellite.state_rows),self.numsatellites,3))
+        for i in range(0,self.numsatellites):
+            self.satellites[i].Bind(self.state,i)
+        self.pos = self.state[Satellite.state_rows.index('current_pos')]
+        self.vel = self.state[Satellite.state_rows.index('current_vel')]
+        self.nominal_pos = self.state[Satellite.state_rows.index('nominal_pos')]
+        self.nominal_vel = self.state[Satellite.state_rows.index('nominal_vel')]
+
     def Derivatives(self):
         for i in range(0,self.numsatellites):
             self.satellites[i].current_accel = np.asarray([0.,0.,0.])
@@ -305,34 +548,107 @@ class SolarSystem():
                 self.satellites[i].current_accel += self.satellites[j].Gravity(dr)
             if i == 0 and self.fixed == True:
                 self.satellites[i].current_accel = np.asarray([0.,0.,0.])
-    def Simulate(self,tfinal,timestep,tnext,fixed):
+    def PackState(self):
+        ##Structure-of-arrays view of the system: pos and vel are contiguous (N,3)
+        ##slices of the shared buffer, mu the (N,) gravitational parameters
+        if len(self.satellites) != self.numsatellites or any(satellite.state is not self.state for satellite in self.satellites):
+            self.BindSatellites()
+        self.mu = np.asarray([satellite.G*satellite.M for satellite in self.satellites],dtype=float)
+
+    def Accelerations(self,pos):
+        ##Same physics as Derivatives() but every pairwise term is computed in
+        ##one broadcast kernel. dr[i,j] = pos[i] - pos[j] exactly like Gravity()
+        ##gravity = 'barneshut' swaps in the octree, 'testparticle' lets massless
+        ##bodies feel only the massive ones
+        if self.gravity == 'barneshut':
+            accel = octree.barnes_hut_accelerations(pos,self.mu,self.theta,self.leaf_size)
+        elif self.gravity == 'testparticle':
+            accel = octree.test_particle_accelerations(pos,self.mu)
+        else:
+            accel = self.DirectAccelerations(pos)
+        if self.fixed == True:
+            accel[0] = 0.0
+        return accel
+
+    def DirectAccelerations(self,pos,chunk_cells=2**20):
+        ##Bodies without mass pull on nothing, and targets are taken in row
+        ##chunks so the (rows,sources,3) separation block stays ~chunk_cells*24 bytes (25 MB)
+        sources = np.flatnonzero(self.mu != 0)
+        source_pos = pos[sources]
+        source_mu = self.mu[sources]
+        accel = np.zeros_like(pos)
+        rows = max(1,chunk_cells//max(1,len(sources)))
+        for first in range(0,len(pos),rows):
+            last = min(first+rows,len(pos))
+            dr = pos[first:last,np.newaxis,:] - source_pos[np.newaxis,:,:]
+            rnorm = np.sqrt(np.einsum('ijk,ijk->ij',dr,dr))
+            close = rnorm < 1e-2 ##Self interaction (and coincident bodies) is skipped
+            rnorm[close] = 1.0
+            coeff = source_mu[np.newaxis,:]/rnorm**3
+            coeff[close] = 0.0
+            accel[first:last] = -np.einsum('ij,ijk->ik',coeff,dr)
+        return accel
+
+    def Simulate(self,tfinal,timestep,tnext,fixed,method='loop',derived=None,store=None,chunk_size=1024,rtol=1e-9,atol=1e-6,
+                 gravity='direct',theta=0.5,leaf_size=8):
+        ##method = 'loop' steps RK4 satellite by satellite, 'vectorized' runs the
+        ##same RK4 scheme on the packed (N,3) arrays and gives the same trajectories.
+        ##method = 'rk45' is adaptive Dormand-Prince: timestep is only the first trial
+        ##step, rtol/atol control the error and samples land exactly on multiples of tnext.
+        ##method = 'leapfrog' (velocity Verlet) or 'yoshida' (4th order) are symplectic
+        ##and need one or three force evaluations per step, see ConservationReport().
+        ##gravity = 'direct' (O(N^2)), 'barneshut' (octree with opening angle theta)
+        ##or 'testparticle' (O(N*M), massless bodies don't attract) for the array methods
+        ##derived = False skips rnorm/vnorm/h/hnorm/phi until ComputeDerived() is called.
+        ##store = directory streams the history to disk every chunk_size samples
+        ##instead of keeping it in RAM, xyz/xyzdot then become memory-mapped views.
+        ##derived defaults to False with a store, the plots compute it for the
+        ##attached history, e.g. a LoadTrajectory() window, when they need it
         print('Simulating System = ',self.name)
         self.fixed = fixed
+        if method not in ('loop','vectorized','rk45','leapfrog','yoshida'):
+            raise ValueError('Unknown simulation method: '+str(method))
+        if gravity not in ('direct','barneshut','testparticle'):
+            raise ValueError('Unknown gravity backend: '+str(gravity))
+        if method == 'loop' and gravity != 'direct':
+            raise ValueError('The loop method only supports direct gravity')
+        self.gravity = gravity
+        self.theta = theta
+        self.leaf_size = leaf_size
+        self.PackState()
+        if derived is None:
+            derived = store is None
+        if store is None:
+            ##rk45 records on the tnext grid, or every accepted step when tnext <= 0,
+            ##then the trial timestep is only a first guess and the recorder grows
+            spacing = tnext if method == 'rk45' and tnext > 0 else timestep
+            recorder = TrajectoryRecorder(self.numsatellites,tfinal,spacing,tnext)
+        else:
+            recorder = fileIO.TrajectoryWriter(store,[satellite.name for satellite in self.satellites],chunk_size)
+        if method == 'vectorized':
+            self.SimulateVectorized(tfinal,timestep,tnext,recorder)
+        elif method == 'rk45':
+            self.SimulateAdaptive(tfinal,timestep,tnext,recorder,rtol,atol)
+        elif method in ('leapfrog','yoshida'):
+            self.SimulateSymplectic(tfinal,timestep,tnext,recorder,method)
+        else:
+            self.SimulateLoop(tfinal,timestep,tnext,recorder)
+        self.AttachTrajectory(recorder,derived)
+        print('Integrator Statistics = ',self.integrator_stats)
+
+        print('Simulation Complete')
+
+    def SimulateLoop(self,tfinal,timestep,tnext,recorder):
         t = 0.
         tthresh = 0.
-        self.time = []
+        steps = 0
         while t <= tfinal:
             for i in range(0,self.numsatellites):
                 self.satellites[i].nominal_pos = self.satellites[i].current_pos
                 self.satellites[i].nominal_vel = self.satellites[i].current_vel
-                if t >= tthresh:
-                    self.satellites[i].xyz.append(self.satellites[i].nominal_pos)
-                    rtnorm = np.linalg.norm(self.satellites[i].nominal_pos)
-                    self.satellites[i].rnorm.append(rtnorm)
-                    
-                    self.satellites[i].xyzdot.append(self.satellites[i].nominal_vel)
-                    vtnorm = np.linalg.norm(self.satellites[i].nominal_vel)
-                    self.satellites[i].vnorm.append(vtnorm)
-                    
-                    ht = np.cross(self.satellites[i].nominal_pos,self.satellites[i].nominal_vel)
-                    htnorm = np.linalg.norm(ht)
-                    self.satellites[i].h.append(ht)
-                    self.satellites[i].hnorm.append(htnorm)
-
-                    self.satellites[i].phi.append(np.arccos(htnorm/(rtnorm*vtnorm)))
 
             if t>=tthresh:
-                self.time.append(t)
+                recorder.Record(t,self.nominal_pos,self.nominal_vel)
                 tthresh += tnext
             self.Derivatives()
 
@@ -380,19 +696,252 @@ class SolarSystem():
                 self.satellites[i].current_vel = self.satellites[i].nominal_vel + rk4vel*timestep           
             
             t+=timestep
+            steps += 1
+        self.integrator_stats = {'method':'loop','accepted_steps':steps,'rejected_steps':0,'force_evaluations':4*steps}
+
+    def SimulateVectorized(self,tfinal,timestep,tnext,recorder):
+        pos = self.pos.copy()
+        vel = self.vel.copy()
+        t = 0.
+        tthresh = 0.
+        steps = 0
+        while t <= tfinal:
+            if t >= tthresh:
+                recorder.Record(t,pos,vel)
+                tthresh += tnext
+
+            k1pos = vel
+            k1vel = self.Accelerations(pos)
+            k2pos = vel + (timestep/2.0)*k1vel
+            k2vel = self.Accelerations(pos + (timestep/2.0)*k1pos)
+            k3pos = vel + (timestep/2.0)*k2vel
+            k3vel = self.Accelerations(pos + (timestep/2.0)*k2pos)
+            k4pos = vel + (timestep)*k3vel
+            k4vel = self.Accelerations(pos + (timestep)*k3pos)
+
+            rk4pos = (1./6.)*(k1pos + 2.0*k2pos + 2.0*k3pos + k4pos)
+            rk4vel = (1./6.)*(k1vel + 2.0*k2vel + 2.0*k3vel + k4vel)
+            pos = pos + rk4pos*timestep
+            vel = vel + rk4vel*timestep
+
+            t+=timestep
+            steps += 1
+        self.pos[...] = pos
+        self.vel[...] = vel
+        self.integrator_stats = {'method':'vectorized','accepted_steps':steps,'rejected_steps':0,'force_evaluations':4*steps}
+
+    def SimulateSymplectic(self,tfinal,timestep,tnext,recorder,method):
+        ##Drift/kick splitting. Leapfrog is kick-drift-kick and reuses the last
+        ##kick's acceleration, Yoshida composes three leapfrog stages into 4th order.
+        pos = self.pos.copy()
+        vel = self.vel.copy()
+        if method == 'yoshida':
+            w1 = 1.0/(2.0 - 2.0**(1./3.))
+            w0 = -2.0**(1./3.)*w1
+            drifts = (w1/2.0,(w0+w1)/2.0,(w0+w1)/2.0,w1/2.0)
+            kicks = (w1,w0,w1)
+            evaluations = 0
+        else:
+            accel = self.Accelerations(pos)
+            evaluations = 1
+        t = 0.
+        tthresh = 0.
+        steps = 0
+        while t <= tfinal:
+            if t >= tthresh:
+                recorder.Record(t,pos,vel)
+                tthresh += tnext
+
+            if method == 'yoshida':
+                for stage in range(0,3):
+                    pos = pos + (drifts[stage]*timestep)*vel
+                    vel = vel + (kicks[stage]*timestep)*self.Accelerations(pos)
+                pos = pos + (drifts[3]*timestep)*vel
+                evaluations += 3
+            else:
+                vel = vel + (timestep/2.0)*accel
+                pos = pos + timestep*vel
+                accel = self.Accelerations(pos)
+                vel = vel + (timestep/2.0)*accel
+                evaluations += 1
+
+            t+=timestep
+            steps += 1
+        self.pos[...] = pos
+        self.vel[...] = vel
+        self.integrator_stats = {'method':method,'accepted_steps':steps,'rejected_steps':0,'force_evaluations':evaluations}
+
+    def StateDerivative(self,y):
+        ##y stacks positions and velocities into a (2,N,3) array
+        return np.stack((y[1],self.Accelerations(y[0])))
+
+    def SimulateAdaptive(self,tfinal,timestep,tnext,recorder,rtol,atol):
+        ##Embedded Dormand-Prince 5(4) with FSAL, so an accepted step costs six
+        ##force evaluations. Samples come from the 4th order dense output.
+        y = np.stack((self.pos,self.vel))
+        f = self.StateDerivative(y)
+        K = np.empty((7,)+y.shape)
+        evaluations = 1
+        accepted = 0
+        rejected = 0
+        t = 0.
+        h = min(timestep,tfinal)
+        recorder.Record(t,y[0],y[1])
+        sample = 1
+        step_rejected = False
+        while t < tfinal:
+            if h >= tfinal - t:
+                h = tfinal - t
+                t_new = tfinal
+            else:
+                t_new = t + h
+            K[0] = f
+            for stage in range(1,6):
+                dy = np.tensordot(DormandPrince.A[stage,:stage],K[:stage],axes=1)
+                K[stage] = self.StateDerivative(y + h*dy)
+            y_new = y + h*np.tensordot(DormandPrince.B,K[:6],axes=1)
+            f_new = self.StateDerivative(y_new)
+            K[6] = f_new
+            evaluations += 6
+
+            error = h*np.tensordot(DormandPrince.E,K,axes=1)
+            scale = atol + rtol*np.maximum(np.abs(y),np.abs(y_new))
+            error_norm = np.sqrt(np.mean((error/scale)**2))
+            if error_norm < 1.0:
+                if tnext > 0:
+                    Q = np.tensordot(DormandPrince.P.T,K,axes=1)
+                    while sample*tnext <= t_new:
+                        sigma = (sample*tnext - t)/h
+                        y_sample = y + h*np.tensordot(sigma**np.arange(1,5),Q,axes=1)
+                        recorder.Record(sample*tnext,y_sample[0],y_sample[1])
+                        sample += 1
+                else:
+                    recorder.Record(t_new,y_new[0],y_new[1])
+                if error_norm == 0.0:
+                    factor = 10.0
+                else:
+                    factor = min(10.0,0.9*error_norm**-0.2)
+                if step_rejected:
+                    factor = min(1.0,factor)
+                y = y_new
+                f = f_new
+                t = t_new
+                accepted += 1
+                step_rejected = False
+            else:
+                factor = max(0.2,0.9*error_norm**-0.2)
+                rejected += 1
+                step_rejected = True
+                ##Same floor as scipy's RK45, a step this small no longer moves t
+                ##(close approach or collision), stop instead of shrinking forever
+                h_min = 10*np.abs(np.nextafter(t,np.inf) - t)
+                if h*factor < h_min:
+                    raise RuntimeError('RK45 step size fell below '+str(h_min)+' s at t = '+str(t)+' s, tolerances cannot be met')
+            h *= factor
+        self.pos[...] = y[0]
+        self.vel[...] = y[1]
+        self.integrator_stats = {'method':'rk45','accepted_steps':accepted,'rejected_steps':rejected,'force_evaluations':evaluations}
+
+    def AttachTrajectory(self,recorder,derived=True):
+        ##Per-satellite histories are (samples,3) views of the system-level arrays
+        self.time,self.xyz,self.xyzdot = recorder.Finalize()
+        self.rnorm = None
+        self.vnorm = None
+        self.h = None
+        self.hnorm = None
+        self.phi = None
         for i in range(0,self.numsatellites):
-            self.satellites[i].xyz = np.asarray(self.satellites[i].xyz)
-            self.satellites[i].rnorm = np.asarray(self.satellites[i].rnorm)
-            self.satellites[i].xyzdot = np.asarray(self.satellites[i].xyzdot)
-            self.satellites[i].vnorm = np.asarray(self.satellites[i].vnorm)
-            self.satellites[i].h = np.asarray(self.satellites[i].h)
-            self.satellites[i].hnorm = np.asarray(self.satellites[i].hnorm)
-            self.satellites[i].phi = np.asarray(self.satellites[i].phi)
-        self.time = np.asarray(self.time)
+            self.satellites[i].xyz = self.xyz[:,i,:]
+            self.satellites[i].xyzdot = self.xyzdot[:,i,:]
+            self.satellites[i].rnorm = None
+            self.satellites[i].vnorm = None
+            self.satellites[i].h = None
+            self.satellites[i].hnorm = None
+            self.satellites[i].phi = None
+        if derived:
+            self.ComputeDerived()
 
-        print('Simulation Complete')
-        
-    def PlotSystem(self,pp,zoomed):
+    def LoadTrajectory(self,store,tstart=None,tstop=None,stride=1,derived=False):
+        ##Attach a time window of a streamed run without reading the rest of it
+        trajectory = fileIO.TrajectoryStore(store)
+        if len(trajectory.names) != self.numsatellites:
+            raise ValueError('Trajectory store '+str(store)+' holds '+str(len(trajectory.names))+' bodies, system has '+str(self.numsatellites))
+        window = trajectory.Window(tstart,tstop,stride)
+        self.AttachTrajectory(TrajectoryWindow(window),derived)
+
+    def ComputeDerived(self):
+        ##Computed quantities for every body and sample in one vectorized pass
+        self.rnorm = np.linalg.norm(self.xyz,axis=2)
+        self.vnorm = np.linalg.norm(self.xyzdot,axis=2)
+        self.h = np.cross(self.xyz,self.xyzdot)
+        self.hnorm = np.linalg.norm(self.h,axis=2)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            self.phi = np.arccos(self.hnorm/(self.rnorm*self.vnorm))
+        for i in range(0,self.numsatellites):
+            self.satellites[i].rnorm = self.rnorm[:,i]
+            self.satellites[i].vnorm = self.vnorm[:,i]
+            self.satellites[i].h = self.h[:,i,:]
+            self.satellites[i].hnorm = self.hnorm[:,i]
+            self.satellites[i].phi = self.phi[:,i]
+
+    def ConservationReport(self):
+        ##Drift of the conserved quantities over the recorded samples. Each body
+        ##gets its two-body energy and angular momentum about satellites[0] (what
+        ##PlotMechanicalEnergy shows), the system gets its total energy and
+        ##total angular momentum.
+        mass = np.asarray([satellite.M for satellite in self.satellites],dtype=float)
+        G = Satellite.G
+        def drift(values):
+            ##Largest deviation from the first sample, relative unless that is zero
+            values = np.asarray(values).reshape(len(values),-1)
+            deviation = np.max(np.linalg.norm(values - values[0],axis=1))
+            scale = np.linalg.norm(values[0])
+            if scale > 0:
+                return float(deviation/scale)
+            return float(deviation)
+
+        i,j = np.triu_indices(self.numsatellites,1)
+        energy = np.empty(len(self.time))
+        for k in range(0,len(self.time)):
+            pos = np.asarray(self.xyz[k])
+            rnorm = np.linalg.norm(pos[i] - pos[j],axis=1)
+            keep = rnorm >= 1e-2
+            potential = -np.sum(G*mass[i[keep]]*mass[j[keep]]/rnorm[keep])
+            kinetic = 0.5*np.sum(mass*np.einsum('ij,ij->i',self.xyzdot[k],self.xyzdot[k]))
+            energy[k] = kinetic + potential
+        momentum = np.einsum('i,tij->tj',mass,np.cross(self.xyz,self.xyzdot))
+        report = {'method':getattr(self,'integrator_stats',{}).get('method'),
+                  'samples':len(self.time),
+                  'system_energy_drift':drift(energy),
+                  'system_angular_momentum_drift':drift(momentum),
+                  'bodies':{}}
+
+        center = self.satellites[0]
+        for i in range(1,self.numsatellites):
+            r = self.xyz[:,i,:] - self.xyz[:,0,:]
+            v = self.xyzdot[:,i,:] - self.xyzdot[:,0,:]
+            specific_energy = np.einsum('ij,ij->i',v,v)/2.0 - center.mu/np.linalg.norm(r,axis=1)
+            h = np.linalg.norm(np.cross(r,v),axis=1)
+            report['bodies'][self.satellites[i].name] = {'energy_drift':drift(specific_energy),'angular_momentum_drift':drift(h)}
+        print('Conservation Report = ',report)
+        return report
+
+    def ScreenConjunctions(self,threshold,window=16,store=None,tstart=None,tstop=None):
+        ##Close approaches below threshold (m) in the recorded or stored trajectory,
+        ##as a conjunction.EVENT_DTYPE table sorted by time of closest approach
+        if store is not None:
+            self.LoadTrajectory(store,tstart,tstop)
+        events = conjunction.screen(self.time,self.xyz,threshold,window)
+        print('Found',len(events),'close approaches below',threshold,'m')
+        for event in events[:10]:
+            print(self.satellites[event['i']].name,'-',self.satellites[event['j']].name,'tca =',event['tca'],'s dca =',event['dca'],'m')
+        return events
+
+    def PlotSystem(self,pp,zoomed,store=None,tstart=None,tstop=None):
+        import matplotlib.pyplot as plt
+        import plotting as P
+        if store is not None:
+            self.LoadTrajectory(store,tstart,tstop)
         u, v = np.mgrid[0:2*np.pi:20j, 0:np.pi:10j]
         xsph = np.cos(u)*np.sin(v)/self.AU
         ysph = np.sin(u)*np.sin(v)/self.AU
@@ -442,6 +991,8 @@ class SolarSystem():
         pp.savefig()
 
     def PlotOrbit(self,pp,zoomed):
+        import matplotlib.pyplot as plt
+        import plotting as P
         u, v = np.mgrid[0:2*np.pi:20j, 0:np.pi:10j]
         xsph = np.cos(u)*np.sin(v)/self.AU
         ysph = np.sin(u)*np.sin(v)/self.AU
@@ -550,36 +1101,59 @@ class SolarSystem():
         mlab.orientation_axes()
         mlab.show()
 
-    def Orbit(self):
+    def Orbit(self,tolerance=None,points=1000):
+        ##All orbit ellipses in one batched call. tolerance (m) picks the number of
+        ##true-anomaly samples per body so the chord error a*dnu^2/8 stays below it,
+        ##otherwise every body gets the same number of points
+        if tolerance is not None and not tolerance > 0:
+            raise ValueError('Orbit tolerance must be positive, got '+str(tolerance))
+        if points < 2:
+            raise ValueError('Orbit needs at least 2 points per body, got '+str(points))
         print('Computing Orbit based on Orbital Elements')
-        nu = np.linspace(0,2*np.pi,1000)
         for i in range(0,self.numsatellites):
             print(self.satellites[i].name)
-            if i == 0:
-                self.satellites[i].xecl = 0*nu
-                self.satellites[i].yecl = 0*nu
-                self.satellites[i].zecl = 0*nu
-                self.satellites[i].x = 0*nu
-                self.satellites[i].y = 0*nu
-                self.satellites[i].z = 0*nu
-            else:
-                self.satellites[i].rorbit = self.satellites[i].initial_semilatus/(1.0 + self.satellites[i].initial_enorm*np.cos(nu))
-                self.satellites[i].xecl = self.satellites[i].a*(np.cos(nu)-self.satellites[i].initial_enorm)
-                self.satellites[i].yecl = self.satellites[i].a*np.sqrt(1-self.satellites[i].initial_enorm**2)*np.sin(nu)
-                self.satellites[i].zecl = 0.0*nu
-                OMEGA = self.satellites[i].initial_OMEGA
-                I = self.satellites[i].initial_i
-                w = self.satellites[i].initial_w
-                xprime = self.satellites[i].xecl
-                yprime = self.satellites[i].yecl                
-                self.satellites[i].x = (np.cos(w)*np.cos(OMEGA) - np.sin(w)*np.sin(OMEGA)*np.cos(I))*xprime + (-np.sin(w)*np.cos(OMEGA)-np.cos(w)*np.sin(OMEGA)*np.cos(I))*yprime
-                self.satellites[i].y = (np.cos(w)*np.sin(OMEGA) + np.sin(w)*np.cos(OMEGA)*np.cos(I))*xprime + (-np.sin(w)*np.sin(OMEGA)+np.cos(w)*np.cos(OMEGA)*np.cos(I))*yprime
-                self.satellites[i].z = (np.sin(w)*np.sin(I))*xprime + (np.cos(w)*np.sin(I))*yprime
-                #self.satellites[i].x = (np.cos(nu)*np.cos(OMEGA) - np.sin(nu)*np.sin(OMEGA)*np.cos(I))*xprime
-                #self.satellites[i].y = (np.cos(nu)*np.sin(OMEGA) + np.sin(nu)*np.cos(OMEGA)*np.cos(I))*xprime
-                #self.satellites[i].z = (np.sin(nu)*np.sin(I))*xprime
-
-    def PlotMechanicalEnergy(self,pp):
+        bodies = self.satellites[1:]
+        a = np.asarray([satellite.a for satellite in bodies],dtype=float)
+        e = np.asarray([satellite.initial_enorm for satellite in bodies],dtype=float)
+        if tolerance is None:
+            counts = np.full(len(bodies),points)
+        else:
+            counts = np.maximum(np.ceil(2*np.pi/np.sqrt(8*tolerance/a)).astype(int)+1,16)
+        self.orbits,nu = OrbitTracks(a,e,
+                                     [satellite.initial_i for satellite in bodies],
+                                     [satellite.initial_OMEGA for satellite in bodies],
+                                     [satellite.initial_w for satellite in bodies],
+                                     counts)
+        self.orbit_points = counts
+        semilatus = np.asarray([satellite.initial_semilatus for satellite in bodies],dtype=float)
+        rorbit = semilatus[:,np.newaxis]/(1.0 + e[:,np.newaxis]*np.cos(nu))
+        xecl = a[:,np.newaxis]*(np.cos(nu)-e[:,np.newaxis])
+        yecl = a[:,np.newaxis]*np.sqrt(1-e[:,np.newaxis]**2)*np.sin(nu)
+
+        zeros = np.zeros(self.orbits.shape[1] if len(bodies) > 0 else points)
+        self.satellites[0].xecl = zeros
+        self.satellites[0].yecl = zeros
+        self.satellites[0].zecl = zeros
+        self.satellites[0].x = zeros
+        self.satellites[0].y = zeros
+        self.satellites[0].z = zeros
+        for i in range(1,self.numsatellites):
+            K = counts[i-1]
+            self.satellites[i].rorbit = rorbit[i-1,:K]
+            self.satellites[i].xecl = xecl[i-1,:K]
+            self.satellites[i].yecl = yecl[i-1,:K]
+            self.satellites[i].zecl = 0.0*nu[i-1,:K]
+            self.satellites[i].x = self.orbits[i-1,:K,0]
+            self.satellites[i].y = self.orbits[i-1,:K,1]
+            self.satellites[i].z = self.orbits[i-1,:K,2]
+
+    def PlotMechanicalEnergy(self,pp,store=None,tstart=None,tstop=None):
+        import matplotlib.pyplot as plt
+        import plotting as P
+        if store is not None:
+            self.LoadTrajectory(store,tstart,tstop)
+        if self.rnorm is None:
+            self.ComputeDerived()
         plti = P.plottool(12,'Time (sec)','Mechanical Energy (J)','Orbiting Satellite Energy')
         orbiting_satellite = self.satellites[1]
         center_satellite = self.satellites[0]
@@ -588,7 +1162,12 @@ class SolarSystem():
         plt.gcf().subplots_adjust(left=0.25)
         pp.savefig()
 
-    def plotPositionVelocity(self,pp):
+    def plotPositionVelocity(self,pp,store=None,tstart=None,tstop=None):
+        import plotting as P
+        if store is not None:
+            self.LoadTrajectory(store,tstart,tstop)
+        if self.rnorm is None:
+            self.ComputeDerived()
         plti = P.plottool(12,'Time (sec)','Position (m)','Position of Satellite')
         for i in range(0,self.numsatellites):
             plti.plot(self.time,self.satellites[i].xyz)
@@ -602,6 +1181,10 @@ class SolarSystem():
 
 
     def plotAngularMomentum(self,pp):
+        import matplotlib.pyplot as plt
+        import plotting as P
+        if self.hnorm is None:
+            self.ComputeDerived()
         plti = P.plottool(12,'Time (sec)','Flight-Path Angle (deg)','Flight Path Angle')
         orbiting_satellite = self.satellites[1]
         plti.plot(self.time,orbiting_satellite.phi*2.0*np.pi/180.)
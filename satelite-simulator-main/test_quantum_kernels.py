@@ -0,0 +1,119 @@
+"""
+The NumPy Grover kernel against the exact Aer statevector of the circuit
+and the PennyLane navigator against both
+
+    python -m pytest test_quantum_kernels.py
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip('qiskit_aer')
+
+import quantum_kernels
+from pennylane_simulator import PennyLaneQuantumNavigator
+from quantum_backend import CircuitNotFound, QuantumNavigationBackend
+
+
+@pytest.fixture(scope='module')
+def backend():
+    return QuantumNavigationBackend()
+
+
+def distribution(counts, num_qubits):
+    """{bitstring: probability} as a dense array indexed by basis state"""
+    probabilities = np.zeros(2**num_qubits)
+    for state, p in counts.items():
+        probabilities[int(state, 2)] = p
+    return probabilities
+
+
+@pytest.mark.parametrize('num_qubits, target_states', [
+    (1, [1]),
+    (2, [2]),
+    (3, [1, 3]),
+    (4, [0, 5, 15]),
+    (5, [7]),
+    (6, [3, 17, 40, 63]),
+])
+def test_grover_kernel_matches_aer(backend, num_qubits, target_states):
+    task = backend.prepare_grover(num_qubits, target_states)
+    expected = distribution(backend.aer_distribution(task), num_qubits)
+    iterations = quantum_kernels.grover_iterations(num_qubits, len(set(target_states)))
+    probabilities = quantum_kernels.grover_probabilities(num_qubits, target_states, iterations)
+    np.testing.assert_allclose(probabilities, expected, atol=1e-9)
+
+
+@pytest.mark.parametrize('iterations', [0, 1, 2, 5])
+def test_grover_kernel_matches_aer_any_iterations(backend, iterations):
+    expected = distribution(backend.aer_distribution(backend.prepare_grover(4, [6, 9], iterations)), 4)
+    np.testing.assert_allclose(quantum_kernels.grover_probabilities(4, [6, 9], iterations), expected, atol=1e-9)
+
+
+def test_numpy_engine_matches_aer(backend):
+    aer = backend.grover_search(5, [2, 19], mode='both', engine='aer')
+    numpy = backend.grover_search(5, [2, 19], mode='both', engine='numpy')
+    assert numpy['iterations'] == aer['iterations']
+    assert numpy['found_state'] in (2, 19)
+    np.testing.assert_allclose(distribution(numpy['all_counts'], 5), distribution(aer['all_counts'], 5), atol=1e-9)
+    # Shots of the circuit and draws from the kernel land on the marked states alike
+    for result in (aer, numpy):
+        assert sum(result['sampled_counts'].get(format(t, '05b'), 0) for t in (2, 19)) > 0.9
+
+
+@pytest.mark.parametrize('iterations', [-1, 1.5, '2', True, 9])
+def test_grover_rejects_bad_iterations(backend, iterations):
+    # 4 qubits, 2 marked states: optimal 2, so at most 8 iterations
+    with pytest.raises(ValueError):
+        backend.prepare_grover(4, [6, 9], iterations)
+
+
+@pytest.mark.parametrize('prepare, args', [
+    ('prepare_superposition', ('3',)),
+    ('prepare_superposition', (0,)),
+    ('prepare_superposition', (21,)),
+    ('prepare_phase_estimation', (True,)),
+    ('prepare_phase_estimation', (30,)),
+    ('prepare_phase_estimation', (3, 'x')),
+    ('prepare_phase_estimation', (3, float('nan'))),
+    ('prepare_grover', (3.0,)),
+])
+def test_prepare_rejects_bad_arguments(backend, prepare, args):
+    # Checked before any 2^n sized state exists, so requests get a 400 instead of a 500 or an exhausted worker
+    with pytest.raises(ValueError):
+        getattr(backend, prepare)(*args)
+
+
+@pytest.mark.parametrize('num_qubits, num_marked, iterations', [(3, 1, 2), (3, 2, 1), (4, 3, 1), (10, 1, 25), (12, 3, 29)])
+def test_grover_iterations(num_qubits, num_marked, iterations):
+    assert quantum_kernels.grover_iterations(num_qubits, num_marked) == iterations
+
+
+@pytest.mark.parametrize('num_qubits, target_states', [(3, [1, 3]), (4, [0, 5, 15]), (5, [9, 3, 9])])
+def test_pennylane_numpy_engine_matches_backend(backend, num_qubits, target_states):
+    state, probability = PennyLaneQuantumNavigator(num_qubits).grover_algorithm(target_states, engine='numpy',
+                                                                                 plot=False)
+    result = backend.grover_search(num_qubits, target_states, mode='exact', engine='aer')
+    assert state in target_states
+    assert probability == pytest.approx(result['probability'])
+    assert result['success_probability'] > 0.9
+
+
+@pytest.mark.parametrize('num_qubits, target_states', [(2, [1, 2]), (3, [1, 3]), (4, [0, 5, 15])])
+def test_pennylane_qnode_matches_kernel(num_qubits, target_states):
+    pytest.importorskip('pennylane')
+    iterations = quantum_kernels.grover_iterations(num_qubits, len(target_states))
+    probabilities = PennyLaneQuantumNavigator(num_qubits).grover_qnode(target_states)(iterations)
+    np.testing.assert_allclose(probabilities, quantum_kernels.grover_probabilities(num_qubits, target_states, iterations),
+                               atol=1e-9)
+
+
+@pytest.mark.parametrize('key, bind', [
+    (('superposition', 40), None),
+    (('phase_estimation', 3), [1.0, 2.0]),
+    (('vqe_ansatz', 1000, 1), None),
+    (('grover', 3, (1,), 10**6), None),
+])
+def test_circuit_ids_outside_limits_are_not_found(backend, key, bind):
+    with pytest.raises(CircuitNotFound):
+        backend.drawings.draw(backend.drawings.circuit_id(key, bind))
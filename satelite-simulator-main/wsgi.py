@@ -0,0 +1,16 @@
+"""
+WSGI entry point for the quantum navigation API
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every worker process imports quantum_backend on its own and so gets its
+own AerSimulator, circuit cache, drawings and job threads. Circuit ids
+are self-describing, and with QUANTUM_JOB_DIR set the workers share one
+job table, so any worker can serve any request. gunicorn.conf.py sets
+that up, warms every worker before it accepts requests and shuts its job
+queue down on exit; other WSGI servers should point QUANTUM_JOB_DIR at a
+directory all workers can reach, call quantum_backend.warm_up() in every
+worker after it starts and quantum_backend.shutdown() when it stops.
+"""
+
+from quantum_backend import app  # noqa: F401